@@ -1,12 +1,40 @@
-import pygame
+import time
+_IMPORT_START = time.perf_counter()
+
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import csv
+import gc
+import json
+import os
+import queue
 import random
+import socket
+import struct
+import sys
+import threading
+import tracemalloc
+import weakref
+from collections import OrderedDict, deque
 from dataclasses import dataclass
-from typing import List, Tuple
+from typing import List, Optional, Tuple
+
+try:
+    import pygame
+except ImportError:  # le moteur (TetrisEngine) tourne sans pygame
+    pygame = None
 
-# Pygame Initialization
-pygame.init()
-pygame.font.init()
-pygame.mixer.init()
+try:
+    from pygame._sdl2 import video as sdl2_video
+except ImportError:  # seulement requis par TextureDisplay
+    sdl2_video = None
+
+try:
+    import numpy as np
+except ImportError:  # seulement requis par BatchTetris
+    np = None
 
 # Game Constants
 BLOCK_SIZE = 30
@@ -15,29 +43,232 @@ GRID_HEIGHT = 20
 SCREEN_WIDTH = GRID_WIDTH * BLOCK_SIZE + 300
 SCREEN_HEIGHT = GRID_HEIGHT * BLOCK_SIZE
 
-# Chargement des sons
-SOUNDS = {
-    'clear': pygame.mixer.Sound('sounds/clear.wav'),
-    'drop': pygame.mixer.Sound('sounds/drop.wav'),
-    'lateral_move': pygame.mixer.Sound('sounds/lateralmove.wav'),
-    'level_up': pygame.mixer.Sound('sounds/levelup.wav'),
-    'rotate': pygame.mixer.Sound('sounds/rotate.wav'),
-    'select': pygame.mixer.Sound('sounds/select.wav'),
-    'start': pygame.mixer.Sound('sounds/start.wav'),
-    'tetris': pygame.mixer.Sound('sounds/tetris.wav'),
-    'game_over': pygame.mixer.Sound('sounds/gameover.wav')
+# Fichiers des sons et de la musique de fond
+SOUND_FILES = {
+    'clear': 'sounds/clear.wav',
+    'drop': 'sounds/drop.wav',
+    'lateral_move': 'sounds/lateralmove.wav',
+    'level_up': 'sounds/levelup.wav',
+    'rotate': 'sounds/rotate.wav',
+    'select': 'sounds/select.wav',
+    'start': 'sounds/start.wav',
+    'tetris': 'sounds/tetris.wav',
+    'game_over': 'sounds/gameover.wav'
+}
+# MUSIC_FILE = 'sounds/tetrismusic.wav'
+MUSIC_FILE = 'sounds/background_music.mp3'
+# Groupes de sons et nombre de canaux reserves a chacun : une rafale de
+# deplacements ne peut pas prendre le canal d'un effacement ou d'un niveau
+SOUND_GROUPS = {
+    'moves': (('lateral_move', 'rotate', 'drop'), 2),
+    'cues': (('clear', 'tetris', 'level_up', 'game_over'), 3),
+    'menu': (('select', 'start'), 1),
 }
+# Intervalle minimal (s) entre deux lectures d'un son ; les demandes plus
+# rapprochees sont fusionnees avec la precedente
+SOUND_MIN_INTERVAL = {'lateral_move': 0.05, 'rotate': 0.05, 'drop': 0.03}
+
+
+class SilentSound:
+    # Remplace un son quand il n'y a pas de peripherique audio ou de fichier
+    def play(self, *args, **kwargs):
+        return None
+
+    def stop(self):
+        pass
+
+    def set_volume(self, volume):
+        pass
+
+
+class AssetManager:
+    def __init__(self, sound_files=SOUND_FILES, music_file=MUSIC_FILE):
+        self.sound_files = dict(sound_files)
+        self.music_file = music_file
+        self.cache = {}
+        self.lock = threading.Lock()
+        self.audio = False
+        self.load_time = None
+        self._prefetch_thread = None
+
+    def init_audio(self):
+        try:
+            if not pygame.mixer.get_init():
+                pygame.mixer.init()
+            self.audio = True
+        except pygame.error:  # pas de peripherique audio
+            self.audio = False
+
+    def sound(self, name):
+        sound = self.cache.get(name)
+        if sound is None:
+            with self.lock:
+                sound = self.cache.get(name)
+                if sound is None:
+                    sound = self.cache[name] = self._decode(name)
+        return sound
+
+    def _decode(self, name):
+        if not self.audio:
+            return SilentSound()
+        try:
+            return pygame.mixer.Sound(self.sound_files[name])
+        except (pygame.error, FileNotFoundError):
+            return SilentSound()
+
+    def start_music(self):
+        if not self.audio or pygame.mixer.music.get_busy():
+            return
+        try:
+            pygame.mixer.music.load(self.music_file)
+        except (pygame.error, FileNotFoundError):
+            return
+        pygame.mixer.music.set_volume(0.5)  # Réglez le volume (0.0 à 1.0)
+        pygame.mixer.music.play(-1)  # -1 pour jouer en boucle infinie
+
+    def prefetch(self):
+        # Decode tous les sons puis lance la musique sur un thread de fond
+        if self._prefetch_thread is not None:
+            return self._prefetch_thread
+
+        def load_all():
+            start = time.perf_counter()
+            for name in self.sound_files:
+                self.sound(name)
+            self.start_music()
+            self.load_time = time.perf_counter() - start
+
+        self._prefetch_thread = threading.Thread(target=load_all, name='assets', daemon=True)
+        self._prefetch_thread.start()
+        return self._prefetch_thread
+
+    def wait(self, timeout=None):
+        if self._prefetch_thread is not None:
+            self._prefetch_thread.join(timeout)
+
+
+class AudioManager:
+    # Lecture des sons hors de la boucle de jeu. play() ne fait que filtrer
+    # et mettre en file ; un thread decode au besoin et joue chaque son sur
+    # un canal libre de son groupe. Sans canal libre, le son est abandonne
+    # plutot que de couper un autre. Les compteurs (self.counters) :
+    # requested, coalesced (fusionnes par SOUND_MIN_INTERVAL), overflow (file
+    # pleine), played et dropped (aucun canal libre dans le groupe).
+    def __init__(self, assets, groups=SOUND_GROUPS, min_interval=SOUND_MIN_INTERVAL,
+                 queue_size=32):
+        self.assets = assets
+        self.groups = groups
+        self.group_of = {name: group for group, (names, _) in groups.items() for name in names}
+        self.min_interval = min_interval
+        self.queue = queue.Queue(queue_size)
+        self.last_played = {}
+        self.channels = None
+        self.counters = dict.fromkeys(
+            ('requested', 'coalesced', 'overflow', 'played', 'dropped'), 0)
+        self._thread = None
+
+    def play(self, name):
+        # Appele par la boucle de jeu : ne bloque jamais
+        if not self.assets.audio or name not in self.group_of:
+            return
+        self.counters['requested'] += 1
+        now = time.perf_counter()
+        if now - self.last_played.get(name, -1.0) < self.min_interval.get(name, 0.0):
+            self.counters['coalesced'] += 1
+            return
+        self.last_played[name] = now
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._serve, name='audio', daemon=True)
+            self._thread.start()
+        try:
+            self.queue.put_nowait(name)
+        except queue.Full:
+            self.counters['overflow'] += 1
+
+    def _reserve_channels(self):
+        # Les canaux des groupes sont reserves : Sound.play() sans canal
+        # explicite (ailleurs) ne peut pas les prendre
+        total = sum(count for _, count in self.groups.values())
+        pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), total))
+        pygame.mixer.set_reserved(total)
+        channels, first = {}, 0
+        for group, (_, count) in self.groups.items():
+            channels[group] = [pygame.mixer.Channel(i) for i in range(first, first + count)]
+            first += count
+        return channels
+
+    def _serve(self):
+        while True:
+            name = self.queue.get()
+            if name is None:
+                return
+            try:
+                if self.channels is None:
+                    self.channels = self._reserve_channels()
+                sound = self.assets.sound(name)
+                if isinstance(sound, SilentSound):  # fichier absent ou illisible
+                    continue
+                for channel in self.channels[self.group_of[name]]:
+                    if not channel.get_busy():
+                        channel.play(sound)
+                        self.counters['played'] += 1
+                        break
+                else:
+                    self.counters['dropped'] += 1
+            except pygame.error:  # mixer ferme entre-temps
+                return
+
+    def close(self):
+        if self._thread is not None:
+            with contextlib.suppress(queue.Full):
+                self.queue.put(None, timeout=1)
+            self._thread.join(1)
+            self._thread = None
+
+    def report(self):
+        return 'audio: ' + ', '.join(f'{name} {count}' for name, count in self.counters.items())
+
 
-# Musique de fond
-# pygame.mixer.music.load('sounds/tetrismusic.wav')
-pygame.mixer.music.load('sounds/background_music.mp3') 
-pygame.mixer.music.set_volume(0.5)  # Réglez le volume (0.0 à 1.0)
-pygame.mixer.music.play(-1)  # -1 pour jouer en boucle infinie
+ASSETS = AssetManager()
+AUDIO = AudioManager(ASSETS)
+
+
+class StartupProfile:
+    # Rapport --profile-startup : import, init, chargement des sons, 1ere image
+    def __init__(self):
+        self.marks = [('start', _IMPORT_START)]
+
+    def mark(self, phase):
+        self.marks.append((phase, time.perf_counter()))
+
+    def report(self):
+        lines = ['Startup profile (ms)']
+        for (_, begin), (phase, end) in zip(self.marks, self.marks[1:]):
+            lines.append(f'  {phase:<12} {(end - begin) * 1000:8.1f}')
+        lines.append(f'  {"total":<12} {(self.marks[-1][1] - _IMPORT_START) * 1000:8.1f}')
+        if ASSETS.load_time is None:
+            lines.append(f'  {"assets":<12} {"pending":>8} (background)')
+        else:
+            lines.append(f'  {"assets":<12} {ASSETS.load_time * 1000:8.1f} (background)')
+        return '\n'.join(lines)
+
+
+def init_pygame():
+    # Pygame Initialization ; les sons sont charges a la demande par ASSETS
+    pygame.init()
+    pygame.font.init()
+    ASSETS.init_audio()
+
+
+def play_sound(game, event):
+    # Observateur du moteur : joue le son portant le nom de l'evenement
+    AUDIO.play(event)
 
 # Colors
 COLORS = {
     'background': (20, 20, 20),
     'grid_lines': (50, 50, 50),
+    'outside': (8, 8, 8),  # zone du plateau a l'ecran non couverte par la vue
     'text': (255, 255, 255),
     'button_normal': (70, 70, 70),
     'button_hover': (100, 100, 100),
@@ -54,7 +285,8 @@ COLORS = {
         'Z': (255, 0, 0),     # Red
         'J': (0, 0, 255),     # Blue
         'L': (255, 165, 0)    # Orange
-    }
+    },
+    'garbage': (110, 110, 110)
 }
 
 # Piece Shapes
@@ -68,6 +300,14 @@ SHAPES = {
     'L': [[0, 0, 1], [1, 1, 1]]
 }
 
+# Actions acceptees par TetrisEngine.step()
+ACTIONS = ('none', 'left', 'right', 'down', 'rotate', 'drop')
+# Entrees enregistrees dans les replays (TetrisEngine.handle_input)
+INPUTS = ('left', 'right', 'down', 'rotate', 'drop', 'gravity', 'pause', 'restart')
+# Touches de jeu (nom pygame.key.name) et action correspondante
+KEY_ACTIONS = {'left': 'left', 'right': 'right', 'down': 'down', 'up': 'rotate',
+               'space': 'drop'}
+
 # Difficulty Levels
 # DIFFICULTIES = {
 #     'easy': {'fall_speed': 0.7, 'speed_increase': 0.3},
@@ -81,28 +321,281 @@ DIFFICULTIES = {
     'hard': {'fall_speed': 0.1, 'speed_increase': 0.45}
 }
 
+# Boucle de jeu : la simulation avance par pas fixes de 1 / TICK_RATE s,
+# quel que soit le rythme d'affichage
+TICK_RATE = 120
+FRAME_RATE = 60
+MAX_FRAME_TIME = 0.25  # au-dela, le retard n'est pas rattrape
+RENDER_MODES = ('throttle', 'vsync', 'uncapped')
+# Affichage : surface de pygame.display, ou textures d'un Renderer SDL2 mis a
+# l'echelle de la fenetre (lissage, ou facteur entier sans flou)
+DISPLAY_BACKENDS = ('surface', 'texture')
+SCALING_MODES = ('smooth', 'integer')
+# Touches maintenues : premiere repetition apres DAS s, puis toutes les ARR s
+DAS = 0.167
+ARR = 0.033
+
+# Progression : nouveau niveau toutes les LINES_PER_LEVEL lignes
+LINES_PER_LEVEL = 1
+MIN_FALL_SPEED = 0.1
+
+# Bitboards: chaque ligne de la grille est un entier, le bit j = colonne j
+FULL_ROW = (1 << GRID_WIDTH) - 1
+PIECE_TYPES = tuple(SHAPES.keys())
+PIECE_INDEX = {t: i + 1 for i, t in enumerate(PIECE_TYPES)}  # 0 = case vide
+GARBAGE = len(PIECE_TYPES) + 1  # couleur des lignes de dechets du mode versus
+_CELL_NAMES = (0,) + PIECE_TYPES + ('garbage',)  # contenu de Tetris.grid par couleur
+
+
+def _shape_masks(shape):
+    # (masques de lignes, colonne la plus a gauche, colonne la plus a droite)
+    masks = tuple(sum(1 << j for j, cell in enumerate(row) if cell) for row in shape)
+    cols = [j for row in shape for j, cell in enumerate(row) if cell]
+    return masks, min(cols), max(cols)
+
+
+def _build_rotations():
+    rotations = {}
+    for piece_type, shape in SHAPES.items():
+        shape = tuple(tuple(row) for row in shape)
+        rotations[piece_type] = []
+        for _ in range(4):
+            rotations[piece_type].append(shape)
+            shape = tuple(zip(*shape[::-1]))
+    return rotations
+
+
+# Les 4 rotations de chaque piece et leurs masques sont precalcules une fois
+ROTATIONS = _build_rotations()
+SHAPE_MASKS = {shape: _shape_masks(shape)
+               for shapes in ROTATIONS.values() for shape in shapes}
+# Profil du bas de chaque forme : (colonne, ligne de la case la plus basse)
+SHAPE_BOTTOMS = {shape: tuple((j, max(i for i, row in enumerate(shape) if row[j]))
+                              for j in range(len(shape[0]))
+                              if any(row[j] for row in shape))
+                 for shape in SHAPE_MASKS}
+
+
+def fits(rows, masks, left, right, x, y, width=GRID_WIDTH):
+    # Vrai si la piece (masques de SHAPE_MASKS) tient dans `rows` en (x, y)
+    if x + left < 0 or x + right >= width:
+        return False
+    for i, mask in enumerate(masks):
+        if mask:
+            r = y + i
+            if r >= len(rows):
+                return False
+            if r >= 0 and rows[r] & (mask << x if x >= 0 else mask >> -x):
+                return False
+    return True
+
 @dataclass
 class Piece:
-    shape: List[List[int]]
+    shape: Tuple[Tuple[int, ...], ...]
     x: int
     y: int
     type: str
+    rotation: int = 0
+
+@dataclass(frozen=True)
+class Snapshot:
+    # Etat immuable d'une partie. Les lignes de couleurs sont des bytes
+    # partages avec la partie et les autres instantanes : seules les lignes
+    # modifiees depuis le precedent occupent de la memoire.
+    __slots__ = ('colors', 'current_piece', 'next_piece', 'score', 'level', 'lines',
+                 'fall_speed', 'game_over', 'paused', 'drawn')
+    colors: Tuple[bytes, ...]
+    current_piece: Tuple[str, int, int, int]  # type, rotation, x, y
+    next_piece: str
+    score: int
+    level: int
+    lines: int
+    fall_speed: float
+    game_over: bool
+    paused: bool
+    drawn: int  # pieces tirees de la sequence
+
+
+# Chiffre binaire de chaque indice de couleur : '0' pour une case vide
+_CELL_BITS = bytes([ord('0')] + [ord('1')] * 255)
+
+class LRUCache:
+    # Cache borne : l'entree la moins recemment utilisee est evincee
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        with self.lock:
+            value = self.entries.get(key, default)
+            if value is default:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size': len(self.entries),
+        }
+
+    def report(self, name):
+        stats = self.stats()
+        return (f'{name}: hits {stats["hits"]}, misses {stats["misses"]}, '
+                f'hit rate {stats["hit_rate"]:.1%}, size {stats["size"]}')
+
+class TextCache:
+    # Polices partagees par taille et cache LRU borne des textes rendus,
+    # indexe par (texte, taille, couleur)
+    def __init__(self, max_size=256):
+        self.fonts = {}
+        self.surfaces = LRUCache(max_size)
+
+    def font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            font = self.fonts[size] = pygame.font.Font(None, size)
+        return font
+
+    def render(self, text, size, color=COLORS['text']):
+        key = (text, size, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.font(size).render(text, True, color)
+            self.surfaces.put(key, surface)
+        return surface
+
+    def stats(self):
+        return self.surfaces.stats()
+
+    def report(self):
+        return self.surfaces.report('text cache')
+
+TEXT_CACHE = TextCache()
+
+class _Section:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, self.start, time.perf_counter())
+
+_NO_SECTION = contextlib.nullcontext()
+
+class Profiler:
+    # Temps passe dans chaque phase de l'image. Desactive, section() renvoie
+    # un contexte vide partage : le cout reste negligeable. Les evenements
+    # individuels ne sont gardes que si une trace est demandee (trace).
+    def __init__(self, window=120, max_events=1_000_000):
+        self.enabled = False
+        self.trace = False
+        self.overlay = False
+        self._enabled_before_overlay = False
+        self.window = window
+        self.frame_index = 0
+        self.samples = {}
+        self.events = deque(maxlen=max_events)
+        self._origin = time.perf_counter()
+
+    def section(self, name):
+        if not self.enabled:
+            return _NO_SECTION
+        return _Section(self, name)
+
+    def record(self, name, start, end):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.window)
+        samples.append(end - start)
+        if self.trace:
+            self.events.append((self.frame_index, name, start, end))
+
+    def next_frame(self):
+        self.frame_index += 1
+
+    def toggle_overlay(self):
+        # L'overlay active la mesure le temps de son affichage seulement
+        self.overlay = not self.overlay
+        if self.overlay:
+            self._enabled_before_overlay = self.enabled
+            self.enabled = True
+        else:
+            self.enabled = self._enabled_before_overlay
+
+    def averages(self):
+        # Moyenne glissante de chaque phase, en ms
+        return {name: sum(values) / len(values) * 1000
+                for name, values in self.samples.items() if values}
+
+    def export(self, path):
+        # Trace au format Chrome (chrome://tracing, Perfetto) ou CSV
+        with open(path, 'w', newline='') as f:
+            if path.endswith('.csv'):
+                writer = csv.writer(f)
+                writer.writerow(['frame', 'phase', 'start_ms', 'duration_ms'])
+                for frame, name, start, end in self.events:
+                    writer.writerow([frame, name, f'{(start - self._origin) * 1000:.3f}',
+                                     f'{(end - start) * 1000:.3f}'])
+            else:
+                pid = os.getpid()
+                json.dump({'traceEvents': [
+                    {'name': name, 'ph': 'X', 'pid': pid, 'tid': 0,
+                     'ts': (start - self._origin) * 1e6, 'dur': (end - start) * 1e6,
+                     'args': {'frame': frame}}
+                    for frame, name, start, end in self.events
+                ], 'displayTimeUnit': 'ms'}, f)
+
+PROFILER = Profiler()
+HUD_REFRESH = 4  # rafraichissements du HUD de profilage par seconde
+
+# Tailles de case du zoom ; chacune divise la zone du plateau a l'ecran
+ZOOM_LEVELS = (2, 3, 5, 6, 10, 15, 20, 30)
+VIEW_MARGIN = 2  # cases gardees visibles autour de la piece courante
+
+# Scenes au repos (menu, pause, fin de partie) : attente bloquante d'un
+# evenement, reveil au plus tard toutes les IDLE_TIMEOUT s
+IDLE_TIMEOUT = 0.5
 
 class Button:
     def __init__(self, x, y, width, height, text, color=None, font_size=24):
         self.rect = pygame.Rect(x, y, width, height)
         self.text = text
-        self.font = pygame.font.Font(None, font_size)
+        self.font_size = font_size
         self.hovered = False
         self.color = color or COLORS['button_normal']
 
+    def fill_color(self):
+        return (min(255, self.color[0] + 30), 
+                min(255, self.color[1] + 30), 
+                min(255, self.color[2] + 30)) if self.hovered else self.color
+
     def draw(self, screen):
-        color = (min(255, self.color[0] + 30), 
-                 min(255, self.color[1] + 30), 
-                 min(255, self.color[2] + 30)) if self.hovered else self.color
-        
-        pygame.draw.rect(screen, color, self.rect)
-        text_surface = self.font.render(self.text, True, COLORS['text'])
+        pygame.draw.rect(screen, self.fill_color(), self.rect)
+        text_surface = TEXT_CACHE.render(self.text, self.font_size)
         text_rect = text_surface.get_rect(center=self.rect.center)
         screen.blit(text_surface, text_rect)
 
@@ -110,10 +603,152 @@ class Button:
         self.hovered = self.rect.collidepoint(mouse_pos)
         return self.hovered
 
+def wait_events(timeout=IDLE_TIMEOUT):
+    # Bloque jusqu'au prochain evenement ou `timeout` s, puis vide la file.
+    # Retourne la liste des evenements, vide si le delai a expire.
+    event = pygame.event.wait(max(1, int(timeout * 1000)))
+    events = pygame.event.get()
+    if event.type != pygame.NOEVENT:
+        events.insert(0, event)
+    return events
+
+
+def hover(buttons, pos):
+    # Met a jour le survol des boutons ; vrai si l'un d'eux a change
+    changed = False
+    for button in buttons:
+        before = button.hovered
+        changed |= button.is_hovered(pos) != before
+    return changed
+
+
+def open_display(vsync=False, backend='surface', fullscreen=False, scaling='smooth'):
+    # Fenetre du processus ; une Session la cree une fois pour toutes ses scenes.
+    # Retourne la surface ou dessiner : celle de pygame.display, ou le canevas
+    # d'une TextureDisplay. Sans Renderer SDL2 utilisable, retombe sur la surface.
+    if backend == 'texture' and sdl2_video is not None:
+        try:
+            return TextureDisplay(fullscreen=fullscreen, scaling=scaling, vsync=vsync).canvas
+        except (pygame.error, sdl2_video.error):
+            pass
+    if vsync:
+        # La synchronisation verticale passe par le renderer de SCALED
+        try:
+            return pygame.display.set_mode(
+                (SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SCALED, vsync=1)
+        except pygame.error:
+            pass
+    return pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+
+
+def present(screen, rects=None):
+    # Montre l'image dessinee dans `screen` : la surface de pygame.display
+    # (en entier ou seulement `rects`), ou le canevas d'une TextureDisplay.
+    # Une surface hors ecran n'a rien a presenter.
+    display = TextureDisplay.of(screen)
+    if display is not None:
+        display.present()
+    elif screen is pygame.display.get_surface():
+        if rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
+
+
+class TextureDisplay:
+    # Fenetre dessinee par un Renderer SDL2, materiel si possible, logiciel
+    # sinon. L'image logique de SCREEN_WIDTH x SCREEN_HEIGHT est mise a
+    # l'echelle de la fenetre, redimensionnable ou plein ecran : lissee
+    # (scaling='smooth') ou par un facteur entier centre ('integer'). Les
+    # coordonnees de la souris restent celles de l'image logique. Les scenes
+    # au repos dessinent dans self.canvas, envoye en entier par present() ;
+    # TextureUI compose ses images directement avec des textures.
+    _displays = {}  # id du canevas -> TextureDisplay ouverte
+
+    def __init__(self, size=(SCREEN_WIDTH, SCREEN_HEIGHT), fullscreen=False,
+                 scaling='smooth', vsync=False):
+        # Filtrage des textures agrandies, lu par SDL a leur creation
+        os.environ['SDL_RENDER_SCALE_QUALITY'] = 'linear' if scaling == 'smooth' else 'nearest'
+        self.scaling = scaling
+        self.window = sdl2_video.Window('Tetris', size=size, resizable=True,
+                                        fullscreen_desktop=fullscreen)
+        try:
+            self.renderer = sdl2_video.Renderer(self.window, vsync=vsync)
+        except sdl2_video.error:
+            self.renderer = sdl2_video.Renderer(self.window, accelerated=0)
+        self.canvas = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self._canvas_texture = None
+        self._textures = weakref.WeakKeyDictionary()
+        self._window_size = None
+        self._caption = None
+        TextureDisplay._displays[id(self.canvas)] = self
+
+    @classmethod
+    def of(cls, screen):
+        # TextureDisplay dont `screen` est le canevas, sinon None
+        display = cls._displays.get(id(screen))
+        return display if display is not None and display.canvas is screen else None
+
+    def texture(self, surface):
+        # Texture d'une surface qui ne change plus (texte, sprite), envoyee
+        # une seule fois et oubliee avec la surface
+        texture = self._textures.get(surface)
+        if texture is None:
+            texture = self._textures[surface] = sdl2_video.Texture.from_surface(
+                self.renderer, surface)
+        return texture
+
+    def begin(self):
+        # Debut d'une image : titre, echelle apres un redimensionnement, fond
+        caption = pygame.display.get_caption()
+        if caption and caption[0] != self._caption:
+            self._caption = self.window.title = caption[0]
+        if self.window.size != self._window_size:
+            self._window_size = self.window.size
+            self._apply_scaling()
+        self.renderer.draw_color = (*COLORS['background'], 255)
+        self.renderer.clear()
+
+    def _apply_scaling(self):
+        renderer = self.renderer
+        renderer.logical_size = (SCREEN_WIDTH, SCREEN_HEIGHT)
+        width, height = self._window_size
+        if self.scaling == 'integer' and width >= SCREEN_WIDTH and height >= SCREEN_HEIGHT:
+            # Le plus grand facteur entier qui tient, image centree
+            factor = min(width // SCREEN_WIDTH, height // SCREEN_HEIGHT)
+            renderer.scale = (factor, factor)
+            renderer.set_viewport(((width // factor - SCREEN_WIDTH) // 2,
+                                   (height // factor - SCREEN_HEIGHT) // 2,
+                                   SCREEN_WIDTH, SCREEN_HEIGHT))
+
+    def present(self):
+        # Image entierement dessinee dans le canevas (scenes au repos)
+        self.begin()
+        if self._canvas_texture is None:
+            self._canvas_texture = sdl2_video.Texture(
+                self.renderer, self.canvas.get_size(), streaming=True)
+        self._canvas_texture.update(self.canvas)
+        self._canvas_texture.draw()
+        self.renderer.present()
+
+    def close(self):
+        TextureDisplay._displays.pop(id(self.canvas), None)
+        self._textures.clear()
+        self._canvas_texture = None
+        self.window.destroy()
+
+
+def game_ui(game, vsync=False, screen=None):
+    # Interface de jeu adaptee a l'affichage de `screen`
+    display = TextureDisplay.of(screen)
+    if display is not None:
+        return TextureUI(game, display)
+    return TetrisUI(game, vsync, screen)
+
+
 class DifficultySelect:
-    def __init__(self):
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption('Tetris - Select Difficulty')
+    def __init__(self, screen=None):
+        self.screen = screen or open_display()
         
         button_width, button_height = 200, 60
         button_x = (SCREEN_WIDTH - button_width) // 2
@@ -126,50 +761,61 @@ class DifficultySelect:
                            'Hard', COLORS['button_difficulty']['hard'])
         }
 
-    def run(self):
-        running = True
-        while running:
-            self.screen.fill(COLORS['background'])
-            
-            # Title and Subtitle
-            font_title = pygame.font.Font(None, 72)
-            font_subtitle = pygame.font.Font(None, 36)
-            
-            title = font_title.render('Tetris', True, COLORS['text'])
-            subtitle = font_subtitle.render('Select Difficulty', True, COLORS['text'])
-            
-            title_rect = title.get_rect(center=(SCREEN_WIDTH // 2, 100))
-            subtitle_rect = subtitle.get_rect(center=(SCREEN_WIDTH // 2, 150))
-            
-            self.screen.blit(title, title_rect)
-            self.screen.blit(subtitle, subtitle_rect)
-            
-            # Draw Difficulty Buttons
-            for button in self.buttons.values():
-                button.draw(self.screen)
-            
-            pygame.display.flip()
+    def run(self, on_first_frame=None):
+        # Scene au repos : rien ne s'anime, l'ecran n'est redessine qu'au
+        # changement de survol d'un bouton ou quand la fenetre est reexposee
+        pygame.display.set_caption('Tetris - Select Difficulty')
+        dirty = True
+        while True:
+            if dirty:
+                self.draw()
+                dirty = False
+                if on_first_frame:
+                    on_first_frame()
+                    on_first_frame = None
             
-            for event in pygame.event.get():
+            for event in wait_events():
                 if event.type == pygame.QUIT:
-                    pygame.quit()
                     return None
                 
+                if event.type in (pygame.WINDOWEXPOSED, pygame.WINDOWSIZECHANGED):
+                    dirty = True
+                
                 if event.type == pygame.MOUSEMOTION:
-                    for button in self.buttons.values():
-                        button.is_hovered(event.pos)
+                    dirty |= hover(self.buttons.values(), event.pos)
                 
                 if event.type == pygame.MOUSEBUTTONDOWN:
                     for name, button in self.buttons.items():
                         if button.is_hovered(event.pos):
                             return name
+
+    def draw(self):
+        self.screen.fill(COLORS['background'])
         
-        return None
+        # Title and Subtitle
+        title = TEXT_CACHE.render('Tetris', 72)
+        subtitle = TEXT_CACHE.render('Select Difficulty', 36)
+        
+        title_rect = title.get_rect(center=(SCREEN_WIDTH // 2, 100))
+        subtitle_rect = subtitle.get_rect(center=(SCREEN_WIDTH // 2, 150))
+        
+        self.screen.blit(title, title_rect)
+        self.screen.blit(subtitle, subtitle_rect)
+        
+        # Draw Difficulty Buttons
+        for button in self.buttons.values():
+            button.draw(self.screen)
+        
+        present(self.screen)
 
 class TetrisUI:
-    def __init__(self, game):
+    # Rendu en mode retenu : seules les cases, panneaux et boutons modifies
+    # depuis l'image precedente sont redessines puis envoyes a l'ecran avec
+    # pygame.display.update(rects). Sur un grand plateau, seule la fenetre
+    # visible (self.view, qui suit la piece) est lue et dessinee.
+    def __init__(self, game, vsync=False, screen=None):
         self.game = game
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.screen = screen or open_display(vsync)
         pygame.display.set_caption('Tetris')
         
         # Game Control Buttons
@@ -180,75 +826,271 @@ class TetrisUI:
             'restart': Button(button_x, 460, button_width, 50, 'Restart'),
             'quit': Button(button_x, 520, button_width, 50, 'Quit')
         }
+        
+        panel_x = GRID_WIDTH * BLOCK_SIZE
+        panel_width = SCREEN_WIDTH - panel_x
+        self.panels = {
+            'next': (pygame.Rect(panel_x, 0, panel_width, 240), self._draw_next_piece),
+            'stats': (pygame.Rect(panel_x, 240, panel_width, 150), self._draw_stats)
+        }
+        
+        self.blocks = {}
+        for piece_type in PIECE_TYPES:
+            block = pygame.Surface((BLOCK_SIZE - 1, BLOCK_SIZE - 1))
+            block.fill(COLORS['pieces'][piece_type])
+            self.blocks[piece_type] = block
+        
+        self.view = (0, 0)
+        self.set_zoom(BLOCK_SIZE)
+
+    def set_zoom(self, cell):
+        # Taille de case a l'ecran ; la vue couvre autant de cases du plateau
+        # que la zone du plateau en contient
+        self.cell = cell
+        self.view_size = (min(self.game.width, GRID_WIDTH * BLOCK_SIZE // cell),
+                          min(self.game.height, GRID_HEIGHT * BLOCK_SIZE // cell))
+        self.static = self._build_static_layer()
+        self.cell_sprites = self._build_cell_sprites()
+        self.invalidate()
+
+    def zoom(self, steps):
+        # steps > 0 rapproche (cases plus grandes), steps < 0 eloigne
+        level = ZOOM_LEVELS.index(self.cell) if self.cell in ZOOM_LEVELS else -1
+        level = max(0, min(len(ZOOM_LEVELS) - 1, level + steps))
+        if ZOOM_LEVELS[level] != self.cell:
+            self.set_zoom(ZOOM_LEVELS[level])
+
+    def _margins(self):
+        # Parties de la zone du plateau a l'ecran hors de la vue : petit
+        # plateau, ou plateau standard vu de loin
+        width, height = self.view_size[0] * self.cell, self.view_size[1] * self.cell
+        area_width, area_height = GRID_WIDTH * BLOCK_SIZE, GRID_HEIGHT * BLOCK_SIZE
+        margins = []
+        if width < area_width:
+            margins.append(pygame.Rect(width, 0, area_width - width, area_height))
+        if height < area_height:
+            margins.append(pygame.Rect(0, height, width, area_height - height))
+        return margins
+
+    def _grid_lines(self):
+        # Segments des lignes de la grille, limites a la vue ; le bord droit
+        # et le bord bas ne sont traces que s'ils ne touchent pas le panneau
+        width, height = self.view_size[0] * self.cell, self.view_size[1] * self.cell
+        lines = []
+        if self.cell >= 5:
+            lines += [((x, 0), (x, height)) for x in range(0, width, self.cell)]
+            lines += [((0, y), (width, y)) for y in range(0, height, self.cell)]
+        if width < GRID_WIDTH * BLOCK_SIZE:
+            lines.append(((width, 0), (width, height)))
+        if height < GRID_HEIGHT * BLOCK_SIZE:
+            lines.append(((0, height), (width, height)))
+        return lines
+
+    def _build_static_layer(self):
+        # Fond et lignes de la grille, dessines une seule fois par zoom
+        static = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert(self.screen)
+        static.fill(COLORS['background'])
+        for rect in self._margins():
+            static.fill(COLORS['outside'], rect)
+        for start, end in self._grid_lines():
+            pygame.draw.line(static, COLORS['grid_lines'], start, end)
+        return static
+
+    def _build_cell_sprites(self):
+        # Les cases completes du plateau : indice 0 la case vide, 1 a 7 un
+        # bloc pose (sous les lignes de la grille) et GARBAGE une case de
+        # dechets, puis GARBAGE + 1 a GARBAGE + 7 un bloc de la piece courante
+        # (par-dessus les lignes) et les 7 suivants une case du fantome
+        # (contour de la piece a l'arrivee)
+        size = self.cell
+        empty = self.static.subsurface((0, 0, size, size)).copy()
+        
+        def block(color, grid_lines):
+            cell = empty.copy()
+            cell.fill(color, (0, 0, size - 1, size - 1))
+            if grid_lines and size >= 5:
+                pygame.draw.line(cell, COLORS['grid_lines'], (0, 0), (0, size - 1))
+                pygame.draw.line(cell, COLORS['grid_lines'], (0, 0), (size - 1, 0))
+            return cell
+        
+        colors = [COLORS['pieces'][piece_type] for piece_type in PIECE_TYPES]
+        locked = [block(color, True) for color in colors + [COLORS['garbage']]]
+        falling = [block(color, False) for color in colors]
+        ghosts = []
+        for color in colors:
+            ghost = empty.copy()
+            pygame.draw.rect(ghost, color, (2, 2, size - 3, size - 3), 2 if size >= 10 else 1)
+            ghosts.append(ghost)
+        return [empty] + locked + falling + ghosts
+
+    def _follow(self):
+        # Fait defiler la vue pour garder la piece courante et VIEW_MARGIN
+        # cases autour visibles, sans sortir du plateau
+        game, piece = self.game, self.game.current_piece
+        cols, rows = self.view_size
+        x, y = self.view
+        left, right = piece.x - VIEW_MARGIN, piece.x + len(piece.shape[0]) + VIEW_MARGIN
+        top, bottom = piece.y - VIEW_MARGIN, piece.y + len(piece.shape) + VIEW_MARGIN
+        x = min(max(x, right - cols), left)
+        y = min(max(y, bottom - rows), top)
+        self.view = (max(0, min(x, game.width - cols)), max(0, min(y, game.height - rows)))
+
+    def idle_timeout(self):
+        # Attente maximale d'un evenement quand la partie est figee : le HUD
+        # de profilage est alors la seule chose qui s'anime
+        return 1 / HUD_REFRESH if PROFILER.overlay else IDLE_TIMEOUT
+
+    def invalidate(self):
+        # Force un redessin complet a la prochaine image
+        self._full_redraw = True
+        self._drawn_state = None
+        self._frame = None
+        self._panel_keys = {}
+        self._button_keys = {}
+        self._messages_key = None
+        self._messages = []
 
     def draw(self):
-        self.screen.fill(COLORS['background'])
+        game = self.game
+        hovered = tuple(button.hovered for button in self.buttons.values())
+        hud = PROFILER.overlay and int(time.perf_counter() * HUD_REFRESH)
+        state = (game.version, game.paused, game.game_over, hovered, hud)
+        if state == self._drawn_state:
+            return False  # Rien n'a change depuis la derniere image
+        self._drawn_state = state
         
-        # Draw Game Grid
-        self._draw_grid()
-        self._draw_current_piece()
-        self._draw_next_piece()
-        self._draw_stats()
+        if self._full_redraw:
+            self.screen.blit(self.static, (0, 0))
+        
+        dirty = []
+        # Draw Game Grid and Game State Messages
+        with PROFILER.section('_draw_grid'):
+            self._draw_grid(dirty)
+        self._draw_panels(dirty)
         
         # Draw Control Buttons
-        for button in self.buttons.values():
-            button.draw(self.screen)
+        with PROFILER.section('buttons'):
+            for name, button in self.buttons.items():
+                if self._button_keys.get(name) != button.hovered:
+                    self._button_keys[name] = button.hovered
+                    self.screen.blit(self.static, button.rect, button.rect)
+                    button.draw(self.screen)
+                    dirty.append(button.rect)
         
-        # Draw Game State Messages
-        self._draw_game_messages()
+        with PROFILER.section('display'):
+            if self._full_redraw:
+                self._full_redraw = False
+                present(self.screen)
+            elif dirty:
+                present(self.screen, dirty)
+        return bool(dirty)
+
+    def _board_frame(self):
+        # Indice de couleur de chaque case visible, piece courante comprise
+        game = self.game
+        if not game.paused and not game.game_over:
+            self._follow()
+        left, top = self.view
+        cols, rows = self.view_size
+        frame = [bytes(row[left:left + cols]) for row in game.colors[top:top + rows]]
+        if not game.paused and not game.game_over:
+            piece = game.current_piece
+            color = PIECE_INDEX[piece.type] + GARBAGE
+            # Le fantome d'abord, la piece le recouvre s'ils se chevauchent
+            ghost_y = piece.y + game.drop_distance()
+            for y, color in ((ghost_y, color + len(PIECE_TYPES)), (piece.y, color)):
+                for i, row in enumerate(piece.shape):
+                    if 0 <= y + i - top < rows:
+                        cells = bytearray(frame[y + i - top])
+                        for j, cell in enumerate(row):
+                            if cell and 0 <= piece.x + j - left < cols:
+                                cells[piece.x + j - left] = color
+                        frame[y + i - top] = bytes(cells)
+        return frame
+
+    def _draw_grid(self, dirty):
+        frame = self._board_frame()
+        cols, rows = self.view_size
+        size = self.cell
+        changed = {}
+        for i, (row, drawn) in enumerate(zip(frame, self._frame or [None] * rows)):
+            if row != drawn:
+                changed[i] = {j for j in range(cols)
+                              if drawn is None or row[j] != drawn[j]}
         
-        pygame.display.flip()
+        # Un message touche par une case modifiee est redessine en entier,
+        # avec toutes les cases qu'il recouvre
+        messages = self._game_messages()
+        if messages is not self._messages:
+            areas = [rect for _, rect in self._messages + messages]
+            self._messages = messages
+        else:
+            areas = [rect for _, rect in messages
+                     if any(self._cells_rect(i, cols).colliderect(rect)
+                            for i, cols in changed.items())]
+        if areas:
+            for _, rect in messages:
+                areas.append(rect)
+            view = pygame.Rect(0, 0, cols * size, rows * size)
+            for rect in areas:
+                # Fond d'abord, pour la partie hors d'un plateau plus petit que la zone
+                self.screen.blit(self.static, rect, rect)
+                dirty.append(rect)
+                # Puis les cases de la vue sous le message ; vue de loin, il
+                # peut ne recouvrir aucune case
+                cells = rect.clip(view)
+                if cells:
+                    for i in range(cells.top // size, (cells.bottom - 1) // size + 1):
+                        changed.setdefault(i, set()).update(
+                            range(cells.left // size, (cells.right - 1) // size + 1))
+        
+        for i, changed_cols in changed.items():
+            if not changed_cols:
+                continue
+            for j in changed_cols:
+                self.screen.blit(self.cell_sprites[frame[i][j]], (j * size, i * size))
+            dirty.append(self._cells_rect(i, changed_cols))
+        self._frame = frame
+        
+        if areas:
+            for surface, rect in messages:
+                self.screen.blit(surface, rect)
 
-    def _draw_grid(self):
-        # Grid background and lines
-        for i in range(GRID_HEIGHT):
-            for j in range(GRID_WIDTH):
-                if self.game.grid[i][j]:
-                    pygame.draw.rect(self.screen, 
-                                     COLORS['pieces'][self.game.grid[i][j]],
-                                     (j * BLOCK_SIZE, 
-                                      i * BLOCK_SIZE, 
-                                      BLOCK_SIZE - 1, 
-                                      BLOCK_SIZE - 1))
-        
-        for x in range(0, GRID_WIDTH * BLOCK_SIZE, BLOCK_SIZE):
-            pygame.draw.line(self.screen, COLORS['grid_lines'], 
-                             (x, 0), (x, GRID_HEIGHT * BLOCK_SIZE))
-        for y in range(0, GRID_HEIGHT * BLOCK_SIZE, BLOCK_SIZE):
-            pygame.draw.line(self.screen, COLORS['grid_lines'], 
-                             (0, y), (GRID_WIDTH * BLOCK_SIZE, y))
-
-    def _draw_current_piece(self):
-        if not self.game.paused and not self.game.game_over:
-            for i, row in enumerate(self.game.current_piece.shape):
-                for j, cell in enumerate(row):
-                    if cell:
-                        pygame.draw.rect(self.screen,
-                                       COLORS['pieces'][self.game.current_piece.type],
-                                       ((self.game.current_piece.x + j) * BLOCK_SIZE,
-                                        (self.game.current_piece.y + i) * BLOCK_SIZE,
-                                        BLOCK_SIZE - 1,
-                                        BLOCK_SIZE - 1))
+    def _blit(self, surface, pos):
+        self.screen.blit(surface, pos)
+
+    def _cells_rect(self, i, cols):
+        left, right = min(cols), max(cols) + 1
+        size = self.cell
+        return pygame.Rect(left * size, i * size, (right - left) * size, size)
+
+    def _draw_panels(self, dirty):
+        game = self.game
+        keys = {
+            'next': (game.next_piece.type, game.paused),
+            'stats': (game.score, game.level, game.lines)
+        }
+        for name, (rect, draw) in self.panels.items():
+            if self._panel_keys.get(name) != keys[name]:
+                self._panel_keys[name] = keys[name]
+                self.screen.blit(self.static, rect, rect)
+                with PROFILER.section(draw.__name__):
+                    draw()
+                dirty.append(rect)
 
     def _draw_next_piece(self):
-        font = pygame.font.Font(None, 36)
-        next_text = font.render('Next:', True, COLORS['text'])
-        self.screen.blit(next_text, (GRID_WIDTH * BLOCK_SIZE + 50, 50))
+        next_text = TEXT_CACHE.render('Next:', 36)
+        self._blit(next_text, (GRID_WIDTH * BLOCK_SIZE + 50, 50))
         
         if not self.game.paused:
+            block = self.blocks[self.game.next_piece.type]
             for i, row in enumerate(self.game.next_piece.shape):
                 for j, cell in enumerate(row):
                     if cell:
-                        pygame.draw.rect(self.screen,
-                                       COLORS['pieces'][self.game.next_piece.type],
-                                       (GRID_WIDTH * BLOCK_SIZE + 70 + j * BLOCK_SIZE,
-                                        100 + i * BLOCK_SIZE,
-                                        BLOCK_SIZE - 1,
-                                        BLOCK_SIZE - 1))
+                        self._blit(block, (GRID_WIDTH * BLOCK_SIZE + 70 + j * BLOCK_SIZE,
+                                           100 + i * BLOCK_SIZE))
 
     def _draw_stats(self):
-        font = pygame.font.Font(None, 36)
-        
         stats = [
             f'Score: {self.game.score}',
             f'Level: {self.game.level}',
@@ -256,43 +1098,297 @@ class TetrisUI:
         ]
         
         for i, stat in enumerate(stats):
-            stat_text = font.render(stat, True, COLORS['text'])
-            self.screen.blit(stat_text, (GRID_WIDTH * BLOCK_SIZE + 50, 250 + i * 50))
+            stat_text = TEXT_CACHE.render(stat, 36)
+            self._blit(stat_text, (GRID_WIDTH * BLOCK_SIZE + 50, 250 + i * 50))
 
-    def _draw_game_messages(self):
-        font = pygame.font.Font(None, 48)
+    def _game_messages(self):
+        # Textes affiches par-dessus le plateau, rendus seulement s'ils changent
+        hud = PROFILER.overlay and int(time.perf_counter() * HUD_REFRESH)
+        key = (self.game.paused, self.game.game_over, self.game.level, hud)
+        if key == self._messages_key:
+            return self._messages
+        self._messages_key = key
+        
+        messages = []
+        if hud:
+            messages.append(self._profiler_overlay())
         
         if self.game.paused:
-            pause_text = font.render('PAUSE', True, COLORS['text'])
+            pause_text = TEXT_CACHE.render('PAUSE', 48)
             text_rect = pause_text.get_rect(
                 center=(GRID_WIDTH * BLOCK_SIZE // 2, 
                         GRID_HEIGHT * BLOCK_SIZE // 2)
             )
-            self.screen.blit(pause_text, text_rect)
+            messages.append((pause_text, text_rect))
         
         if self.game.game_over:
-            game_over_text = font.render('GAME OVER', True, COLORS['text'])
+            game_over_text = TEXT_CACHE.render('GAME OVER', 48)
             text_rect = game_over_text.get_rect(
                 center=(GRID_WIDTH * BLOCK_SIZE // 2, 
                         GRID_HEIGHT * BLOCK_SIZE // 2)
             )
-            self.screen.blit(game_over_text, text_rect)
+            messages.append((game_over_text, text_rect))
 
         if not self.game.game_over and not self.game.paused:
-            # font = pygame.font.Font(None, 48)
-            level_text = font.render(f'Level {self.game.level}', True, COLORS['text'])
+            level_text = TEXT_CACHE.render(f'Level {self.game.level}', 48)
             text_rect = level_text.get_rect(center=(GRID_WIDTH * BLOCK_SIZE // 2, 50))
-            self.screen.blit(level_text, text_rect)
+            messages.append((level_text, text_rect))
+        return messages
+
+    def _profiler_overlay(self):
+        # HUD de profilage (F3) : moyenne glissante de chaque phase
+        font = TEXT_CACHE.font(20)
+        averages = sorted(PROFILER.averages().items())
+        hud = pygame.Surface((220, 8 + 16 * max(1, len(averages))), pygame.SRCALPHA)
+        hud.fill((0, 0, 0, 180))
+        for i, (name, ms) in enumerate(averages):
+            hud.blit(font.render(name, True, COLORS['text']), (6, 4 + i * 16))
+            value = font.render(f'{ms:.3f} ms', True, COLORS['text'])
+            hud.blit(value, value.get_rect(topright=(214, 4 + i * 16)))
+        return hud, hud.get_rect(topleft=(5, 80))
+
+
+class TextureUI(TetrisUI):
+    # Meme interface, composee par le Renderer d'une TextureDisplay : l'atlas
+    # des cases (self.cell_sprites cote a cote) est une texture envoyee une
+    # fois par zoom, chaque texte une fois par rendu. Chaque image
+    # est recomposee en entier par copies de textures, que le Renderer met a
+    # l'echelle de la fenetre.
+    def __init__(self, game, display):
+        self.display = display
+        super().__init__(game, screen=display.canvas)
+
+    def set_zoom(self, cell):
+        super().set_zoom(cell)
+        atlas = pygame.Surface((cell * len(self.cell_sprites), cell))
+        for i, sprite in enumerate(self.cell_sprites):
+            atlas.blit(sprite, (i * cell, 0))
+        self.atlas = sdl2_video.Texture.from_surface(self.display.renderer, atlas)
+        self._sources = [(i * cell, 0, cell, cell) for i in range(len(self.cell_sprites))]
+
+    def draw(self):
+        game = self.game
+        display = self.display
+        hovered = tuple(button.hovered for button in self.buttons.values())
+        hud = PROFILER.overlay and int(time.perf_counter() * HUD_REFRESH)
+        state = (game.version, game.paused, game.game_over, hovered, hud,
+                 display.window.size, pygame.display.get_caption())
+        if state == self._drawn_state:
+            return False  # Rien n'a change depuis la derniere image
+        self._drawn_state = state
+
+        display.begin()
+        renderer = display.renderer
+        with PROFILER.section('_draw_grid'):
+            # Le fond est celui de begin() ; les lignes de la grille sont
+            # tracees plutot que copiees d'une texture plein ecran, bien plus
+            # couteuse a agrandir pour un renderer logiciel
+            size, atlas, sources = self.cell, self.atlas, self._sources
+            renderer.draw_color = (*COLORS['outside'], 255)
+            for rect in self._margins():
+                renderer.fill_rect(rect)
+            renderer.draw_color = (*COLORS['grid_lines'], 255)
+            for start, end in self._grid_lines():
+                renderer.draw_line(start, end)
+            for i, row in enumerate(self._board_frame()):
+                for j, color in enumerate(row):
+                    if color:
+                        atlas.draw(sources[color], (j * size, i * size, size, size))
+            for surface, rect in self._game_messages():
+                self._blit(surface, rect)
+        for rect, draw in self.panels.values():
+            with PROFILER.section(draw.__name__):
+                draw()
+
+        with PROFILER.section('buttons'):
+            for button in self.buttons.values():
+                renderer.draw_color = (*button.fill_color(), 255)
+                renderer.fill_rect(button.rect)
+                text = TEXT_CACHE.render(button.text, button.font_size)
+                self._blit(text, text.get_rect(center=button.rect.center))
+
+        with PROFILER.section('display'):
+            display.renderer.present()
+        return True
+
+    def _blit(self, surface, pos):
+        rect = surface.get_rect(topleft=pos[:2])
+        self.display.texture(surface).draw(None, rect)
 
-class Tetris:
-    def __init__(self, difficulty='medium'):
+
+class SpectatorWall:
+    # Mosaique de plusieurs parties dans une seule fenetre, sans TetrisUI.
+    # Chaque plateau est une vue numpy sur le tampon de game.cells() ; une
+    # seule indexation le colorie (table des couleurs, contour des cases
+    # compris) et l'agrandit, puis pygame.surfarray l'ecrit dans sa tuile.
+    # Seuls les plateaux dont game.version a change sont redessines.
+    GAP = 8
+    LABEL = 18  # hauteur de la ligne de score au-dessus de chaque plateau
+    MAX_GAMES = 1024  # 32 x 32 tuiles en 1920x1080 laissent encore 7 pixels de plateau
+
+    def __init__(self, games, columns=None, size=(1920, 1080)):
+        if np is None:
+            raise RuntimeError('SpectatorWall requires numpy')
+        self.games = list(games)
+        count = len(self.games)
+        self.columns = columns or int((count - 1) ** 0.5) + 1
+        rows = -(-count // self.columns)
+        self.screen = pygame.display.set_mode(size)
+        self.screen.fill((0, 0, 0))
+        tile_w, tile_h = size[0] // self.columns, size[1] // rows
+        width, height = self.games[0].width, self.games[0].height
+        room_w, room_h = tile_w - self.GAP, tile_h - self.GAP - self.LABEL
+        if room_w < 1 or room_h < 1:
+            raise ValueError(f'{count} games do not fit in a {size[0]}x{size[1]} wall')
+        # Plateau plus grand que sa tuile : une case sur `stride` dans chaque
+        # direction, lignes alignees sur le bas du plateau
+        stride = self.stride = max(1, -(-width // room_w), -(-height // room_h))
+        cell = self.cell = max(1, min(room_w // width, room_h // height))
+        board_w = -(-width // stride) * cell
+        board_h = -(-height // stride) * cell
+
+        # Couleur de chaque indice de _CELL_NAMES, puis la meme table pour
+        # le contour bas et droit des cases (grille sur les cases vides)
+        colors = [COLORS['background']] + [COLORS['pieces'][t] for t in PIECE_TYPES]
+        colors.append(COLORS['garbage'])
+        edges = [COLORS['grid_lines']] + [COLORS['background']] * (len(colors) - 1)
+        self.lut = np.array([self.screen.map_rgb(c) for c in colors + edges], dtype=np.uint32)
+        # Indices des cases lues par chaque pixel agrandi, et decalage vers
+        # la table des contours pour les pixels de bord (si les cases sont
+        # assez grandes pour en avoir un)
+        self._pixel_rows = height - 1 - (board_h - 1 - np.arange(board_h))[:, None] // cell * stride
+        self._pixel_cols = np.arange(board_w)[None, :] // cell * stride
+        edge = np.zeros((board_h, board_w), dtype=np.uint8)
+        if cell >= 4:
+            edge[cell - 1::cell, :] = len(colors)
+            edge[:, cell - 1::cell] = len(colors)
+        self._edge = edge
+
+        self.tiles = []
+        self.labels = []
+        self.views = []
+        for k, game in enumerate(self.games):
+            x = (k % self.columns) * tile_w + (tile_w - board_w) // 2
+            y = (k // self.columns) * tile_h + self.GAP // 2
+            self.labels.append(pygame.Rect(x, y, board_w, self.LABEL))
+            self.tiles.append(self.screen.subsurface((x, y + self.LABEL, board_w, board_h)))
+            self.views.append(np.frombuffer(game.cells(), dtype=np.uint8).reshape(height, width))
+        self.drawn = [None] * count
+        self.scores = [None] * count
+        self.stats = FrameStats()
         self.clock = pygame.time.Clock()
+        pygame.display.flip()
+
+    def draw(self):
+        # Redessine les plateaux modifies ; retourne le nombre de plateaux redessines
+        dirty = []
+        for k, game in enumerate(self.games):
+            if self.drawn[k] == game.version:
+                continue
+            self.drawn[k] = game.version
+            game.cells()  # met a jour le tampon vu par self.views[k]
+            pixels = self.lut[self.views[k][self._pixel_rows, self._pixel_cols] + self._edge]
+            tile = self.tiles[k]
+            pygame.surfarray.blit_array(tile, pixels.T)
+            dirty.append(pygame.Rect(tile.get_abs_offset(), tile.get_size()))
+
+            label = (game.score, game.game_over)
+            if label != self.scores[k]:
+                self.scores[k] = label
+                rect = self.labels[k]
+                self.screen.fill((0, 0, 0), rect)
+                text = TEXT_CACHE.render(
+                    f'#{k + 1}  {game.score}' + ('  over' if game.game_over else ''), self.LABEL)
+                self.screen.blit(text, rect)
+                dirty.append(rect)
+        if dirty:
+            present(self.screen, dirty)
+        return len(dirty)
+
+    def run(self, advance=None, seconds=None):
+        # Boucle a FRAME_RATE ; advance(dt) fait avancer les parties si elles
+        # ne le sont pas ailleurs. S'arrete a la fermeture ou apres `seconds` s.
+        pygame.display.set_caption(f'Tetris - {len(self.games)} games')
+        start = previous = time.perf_counter()
+        while seconds is None or previous - start < seconds:
+            self.clock.tick(FRAME_RATE)
+            now = time.perf_counter()
+            self.stats.add('frame', now - previous)
+            dt, previous = min(now - previous, MAX_FRAME_TIME), now
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return
+            if advance:
+                advance(dt)
+                self.stats.add('tick', time.perf_counter() - now)
+            self.draw()
+
+
+def spectator_bots(count, seed=None, width=GRID_WIDTH, height=GRID_HEIGHT):
+    # `count` parties jouees au hasard, pour le mur de spectateurs : une action
+    # toutes les 150 ms environ, la chute a la vitesse de chaque partie et une
+    # nouvelle partie des que la precedente est perdue. Retourne (games, advance).
+    rng = random.Random(seed)
+    games = [TetrisEngine(rng.choice(_DIFFICULTY_NAMES), random.Random(rng.random()),
+                          width, height) for _ in range(count)]
+    fall_times = [0.0] * count
+
+    def advance(dt):
+        for k, game in enumerate(games):
+            if game.game_over:
+                game.reset_game()
+            if rng.random() < dt / 0.15:
+                game.apply_action(rng.choice(ACTIONS[1:]))
+            fall_times[k] += dt
+            if fall_times[k] >= game.fall_speed:
+                fall_times[k] -= game.fall_speed
+                game.gravity()
+    return games, advance
+
+class TetrisEngine:
+    # Regles du jeu seules : pas de pygame, ni affichage, ni son.
+    # L'affichage et les sons s'abonnent aux evenements via add_observer().
+    def __init__(self, difficulty='medium', rng=None, width=GRID_WIDTH, height=GRID_HEIGHT,
+                 history=False):
         self.difficulty = difficulty
+        self.rng = rng or random.Random()
+        self.width = width
+        self.height = height
+        self.observers = []
+        self.version = 0  # incremente a chaque changement d'etat
+        # Types des pieces tirees, rejoues a l'identique apres un retour en arriere
+        self.sequence = bytearray()
+        self.drawn = 0
+        # Instantane au debut de chaque piece si history, pour undo/rewind
+        self.history = [] if history else None
+        self.history_pos = 0
+        self._empty_row = bytes(width)
+        # Tampon de game.cells(), rempli sur place a la demande
+        self._cells = bytearray(width * height)
+        self._cells_version = None
+        self.reset_game()
+
+    def add_observer(self, observer):
+        # observer(game, event) avec event parmi 'lateral_move', 'drop',
+        # 'rotate', 'level_up' et 'game_over'
+        self.observers.append(observer)
+
+    def notify(self, event):
+        for observer in self.observers:
+            observer(self, event)
+
+    def new_game(self, difficulty, rng):
+        # Autre partie, avec sa propre suite de pieces
+        self.difficulty = difficulty
+        self.rng = rng
+        self.sequence = bytearray()
+        self.drawn = 0
         self.reset_game()
-        self.ui = TetrisUI(self)
 
     def reset_game(self):
-        self.grid = [[0 for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
+        self.rows = [0] * self.height
+        self.colors = [self._empty_row] * self.height
+        self._rebuild_index()
         self.current_piece = self.new_piece()
         self.next_piece = self.new_piece()
         self.score = 0
@@ -302,42 +1398,125 @@ class Tetris:
         self.paused = False
         
         self.fall_speed = DIFFICULTIES[self.difficulty]['fall_speed']
+        self.version += 1
+        if self.history is not None:
+            self.history = []
+            self._push_history()
+
+    def _rebuild_index(self):
+        # Hauteur de chaque colonne et nombre de cases pleines de chaque ligne,
+        # tenus a jour ensuite par place_piece() et clear_lines()
+        self.heights = [0] * self.width
+        for i, row in enumerate(self.rows):
+            while row:
+                low = row & -row
+                j = low.bit_length() - 1
+                if not self.heights[j]:
+                    self.heights[j] = self.height - i
+                row ^= low
+        self.row_counts = [bin(row).count('1') for row in self.rows]
+
+    @property
+    def grid(self):
+        # Vue liste de listes (type de piece ou 0), pour compatibilite
+        return [[_CELL_NAMES[c] for c in row] for row in self.colors]
+
+    def cells(self):
+        # Couleur de chaque case (indice de _CELL_NAMES), piece courante
+        # comprise, ligne par ligne dans un bytearray de width * height
+        # octets. Toujours le meme tampon, remis a jour sur place quand
+        # self.version a change : une vue numpy dessus reste valide.
+        if self._cells_version != self.version:
+            cells = self._cells
+            cells[:] = b''.join(self.colors)
+            if not self.paused and not self.game_over:
+                piece = self.current_piece
+                color = PIECE_INDEX[piece.type]
+                for i, row in enumerate(piece.shape):
+                    start = (piece.y + i) * self.width + piece.x
+                    for j, cell in enumerate(row):
+                        if cell:
+                            cells[start + j] = color
+            self._cells_version = self.version
+        return self._cells
 
     def new_piece(self) -> Piece:
-        piece_type = random.choice(list(SHAPES.keys()))
-        shape = SHAPES[piece_type]
+        if self.drawn == len(self.sequence):
+            self.sequence.append(PIECE_INDEX[self.rng.choice(PIECE_TYPES)])
+        self.drawn += 1
+        return self._spawn(PIECE_TYPES[self.sequence[self.drawn - 1] - 1])
+
+    def _spawn(self, piece_type):
+        shape = ROTATIONS[piece_type][0]
         return Piece(
             shape=shape,
-            x=GRID_WIDTH // 2 - len(shape[0]) // 2,
+            x=self.width // 2 - len(shape[0]) // 2,
             y=0,
             type=piece_type
         )
 
     def rotate_piece(self):
-        shape = self.current_piece.shape
-        rotated = list(zip(*shape[::-1]))
-        if self.is_valid_move(rotated, self.current_piece.x, self.current_piece.y):
-            self.current_piece.shape = [list(row) for row in rotated]
+        piece = self.current_piece
+        rotation = (piece.rotation + 1) % 4
+        rotated = ROTATIONS[piece.type][rotation]
+        if self.is_valid_move(rotated, piece.x, piece.y):
+            piece.shape = rotated
+            piece.rotation = rotation
+            self.version += 1
+            return True
+        return False
 
     def is_valid_move(self, shape, x, y):
-        for i, row in enumerate(shape):
-            for j, cell in enumerate(row):
-                if cell:
-                    if (y + i >= GRID_HEIGHT or 
-                        x + j < 0 or 
-                        x + j >= GRID_WIDTH or 
-                        (y + i >= 0 and self.grid[y + i][x + j])):
-                        return False
-        return True
+        try:
+            masks, left, right = SHAPE_MASKS[shape]
+        except (KeyError, TypeError):
+            masks, left, right = _shape_masks(shape)
+        return fits(self.rows, masks, left, right, x, y, self.width)
+
+    def drop_distance(self):
+        # Nombre de lignes dont la piece courante peut tomber. Si toutes ses
+        # cases sont au-dessus du sommet de leur colonne, le profil du bas
+        # contre la carte des hauteurs suffit ; sous un surplomb, on descend
+        # ligne par ligne.
+        piece = self.current_piece
+        distance = self.height
+        for j, bottom in SHAPE_BOTTOMS[piece.shape]:
+            gap = self.height - self.heights[piece.x + j] - 1 - (piece.y + bottom)
+            if gap < 0:
+                break
+            distance = min(distance, gap)
+        else:
+            return distance
+        masks, left, right = SHAPE_MASKS[piece.shape]
+        distance = 0
+        while fits(self.rows, masks, left, right, piece.x, piece.y + distance + 1, self.width):
+            distance += 1
+        return distance
 
     def place_piece(self):
-        for i, row in enumerate(self.current_piece.shape):
-            for j, cell in enumerate(row):
-                if cell:
-                    self.grid[self.current_piece.y + i][self.current_piece.x + j] = \
-                        self.current_piece.type
+        self.version += 1
+        piece = self.current_piece
+        masks = SHAPE_MASKS[piece.shape][0]
+        color = PIECE_INDEX[piece.type]
+        touched = []
+        for i, mask in enumerate(masks):
+            if mask:
+                r = piece.y + i
+                bits = mask << piece.x if piece.x >= 0 else mask >> -piece.x
+                self.rows[r] |= bits
+                self.row_counts[r] += bin(bits).count('1')
+                touched.append(r)
+                # Copie sur ecriture : les instantanes gardent l'ancienne ligne
+                colors = bytearray(self.colors[r])
+                while bits:
+                    low = bits & -bits
+                    j = low.bit_length() - 1
+                    colors[j] = color
+                    self.heights[j] = max(self.heights[j], self.height - r)
+                    bits ^= low
+                self.colors[r] = bytes(colors)
         
-        self.clear_lines()
+        self.clear_lines(touched)
         self.current_piece = self.next_piece
         self.next_piece = self.new_piece()
         
@@ -345,6 +1524,149 @@ class Tetris:
                                   self.current_piece.x, 
                                   self.current_piece.y):
             self.game_over = True
+            self.notify('game_over')
+        self._push_history()
+
+    def move(self, dx):
+        piece = self.current_piece
+        if self.is_valid_move(piece.shape, piece.x + dx, piece.y):
+            piece.x += dx
+            self.version += 1
+            self.notify('lateral_move')
+            return True
+        return False
+
+    def soft_drop(self):
+        piece = self.current_piece
+        if self.is_valid_move(piece.shape, piece.x, piece.y + 1):
+            piece.y += 1
+            self.version += 1
+            self.notify('drop')
+            return True
+        return False
+
+    def rotate(self):
+        rotated = self.rotate_piece()
+        self.notify('rotate')
+        return rotated
+
+    def hard_drop(self):
+        self.current_piece.y += self.drop_distance()
+        self.place_piece()
+        self.notify('drop')
+        return True
+
+    def gravity(self):
+        # Chute automatique d'une ligne, verrouillage si bloquee
+        piece = self.current_piece
+        if self.is_valid_move(piece.shape, piece.x, piece.y + 1):
+            piece.y += 1
+            self.version += 1
+        else:
+            self.place_piece()
+
+    def snapshot(self) -> Snapshot:
+        piece = self.current_piece
+        return Snapshot(
+            colors=tuple(self.colors),
+            current_piece=(piece.type, piece.rotation, piece.x, piece.y),
+            next_piece=self.next_piece.type,
+            score=self.score,
+            level=self.level,
+            lines=self.lines,
+            fall_speed=self.fall_speed,
+            game_over=self.game_over,
+            paused=self.paused,
+            drawn=self.drawn
+        )
+
+    def restore(self, snapshot: Snapshot):
+        # Les lignes sont reprises telles quelles, sans copie ; les masques
+        # se deduisent des couleurs
+        self.colors = list(snapshot.colors)
+        self.rows = [int(row[::-1].translate(_CELL_BITS), 2) for row in self.colors]
+        self._rebuild_index()
+        piece_type, rotation, x, y = snapshot.current_piece
+        self.current_piece = Piece(ROTATIONS[piece_type][rotation], x, y, piece_type, rotation)
+        self.next_piece = self._spawn(snapshot.next_piece)
+        self.score = snapshot.score
+        self.level = snapshot.level
+        self.lines = snapshot.lines
+        self.fall_speed = snapshot.fall_speed
+        self.game_over = snapshot.game_over
+        self.paused = snapshot.paused
+        self.drawn = snapshot.drawn
+        self.version += 1
+
+    def _push_history(self):
+        # Nouvel etat en fin d'historique ; les etats annules sont oublies
+        if self.history is not None:
+            del self.history[self.history_pos + 1:]
+            self.history.append(self.snapshot())
+            self.history_pos = len(self.history) - 1
+
+    def rewind(self, pieces):
+        # Recule (pieces < 0) ou avance dans l'historique jusqu'au debut d'une
+        # piece. Faux sans historique.
+        if not self.history:
+            return False
+        self.history_pos = max(0, min(len(self.history) - 1, self.history_pos + pieces))
+        self.restore(self.history[self.history_pos])
+        return True
+
+    def state(self):
+        piece = self.current_piece
+        return {
+            'rows': tuple(self.rows),
+            'piece': piece.type,
+            'rotation': piece.rotation,
+            'x': piece.x,
+            'y': piece.y,
+            'next': self.next_piece.type,
+            'score': self.score,
+            'level': self.level,
+            'lines': self.lines,
+        }
+
+    def apply_action(self, action):
+        # Vrai si l'action a pu etre appliquee
+        if action == 'left':
+            return self.move(-1)
+        elif action == 'right':
+            return self.move(1)
+        elif action == 'down':
+            return self.soft_drop()
+        elif action == 'rotate':
+            return self.rotate()
+        elif action == 'drop':
+            return self.hard_drop()
+        elif action != 'none':
+            raise ValueError(f'Unknown action: {action!r}')
+        return True
+
+    def handle_input(self, action):
+        # Entree de INPUTS : action du joueur, chute automatique, pause ou
+        # redemarrage. C'est ce qui est enregistre et rejoue par les replays.
+        if action == 'gravity':
+            self.gravity()
+        elif action == 'pause':
+            self.paused = not self.paused
+        elif action == 'restart':
+            self.reset_game()
+        else:
+            return self.apply_action(action)
+        return True
+
+    def step(self, action):
+        # Applique une action de ACTIONS puis un pas de gravite.
+        # Retourne (state, reward, done), reward etant le gain de score.
+        if self.game_over or self.paused:
+            return self.state(), 0, self.game_over
+        score = self.score
+        self.apply_action(action)
+        if action != 'drop' and not self.game_over:
+            self.gravity()
+        return self.state(), self.score - score, self.game_over
 
     # def clear_lines(self):
     #     lines_cleared = 0
@@ -365,171 +1687,1795 @@ class Tetris:
     #             speed_increase = DIFFICULTIES[self.difficulty]['speed_increase']
     #             self.fall_speed = max(0.1, self.fall_speed - speed_increase)
 
-    def clear_lines(self):
-        lines_cleared = 0
-        for i in range(GRID_HEIGHT):
-            if all(self.grid[i]):
-                del self.grid[i]
-                self.grid.insert(0, [0 for _ in range(GRID_WIDTH)])
-                lines_cleared += 1
-        
+    def clear_lines(self, touched=None):
+        # Seules les lignes `touched` (toutes par defaut) peuvent etre pleines
+        if touched is None:
+            touched = range(self.height)
+        cleared = {i for i in touched if self.row_counts[i] == self.width}
+        lines_cleared = len(cleared)
         if lines_cleared:
+            # Tout est vide au-dessus de la pile : on ne tasse, sur place, que
+            # les lignes entre le sommet de la pile et la plus basse effacee
+            rows, colors, counts = self.rows, self.colors, self.row_counts
+            top = self.height - max(self.heights)
+            dest = max(cleared)
+            for src in range(dest - 1, top - 1, -1):
+                if src not in cleared:
+                    rows[dest], colors[dest], counts[dest] = rows[src], colors[src], counts[src]
+                    dest -= 1
+            for i in range(top, dest + 1):
+                rows[i], colors[i], counts[i] = 0, self._empty_row, 0
+            # Le sommet de chaque colonne descend d'au moins lines_cleared
+            for j in range(self.width):
+                top = self.height - self.heights[j] + lines_cleared
+                while top < self.height and not rows[top] >> j & 1:
+                    top += 1
+                self.heights[j] = self.height - top
+            
             self.lines += lines_cleared
             self.score += lines_cleared * 100 * self.level
             
             # Augmenter le niveau et réduire `fall_speed`
-            new_level = self.lines // 1 + 1  # Nouveau niveau après chaque 1 lignes
+            new_level = self.lines // LINES_PER_LEVEL + 1
             if new_level > self.level:
                 self.level = new_level
                 speed_increase = DIFFICULTIES[self.difficulty]['speed_increase']
-                self.fall_speed = max(0.1, self.fall_speed - speed_increase)
-                SOUNDS['level_up'].play()  # Jouer le son de progression de niveau
+                self.fall_speed = max(MIN_FALL_SPEED, self.fall_speed - speed_increase)
+                self.notify('level_up')  # Jouer le son de progression de niveau
+
+class BatchTetris:
+    # N parties avancees ensemble avec NumPy. Les plateaux sont un tableau
+    # (N, GRID_HEIGHT) de masques de lignes ; step() prend un tableau d'indices
+    # dans ACTIONS et applique, comme TetrisEngine.step, l'action puis un pas
+    # de gravite sur toutes les parties en cours.
+    LEFT, RIGHT, DOWN, ROTATE, DROP = (ACTIONS.index(a) for a in ACTIONS[1:])
+
+    def __init__(self, n, difficulty='medium', seed=None):
+        if np is None:
+            raise RuntimeError('BatchTetris requires numpy')
+        self.n = n
+        self.difficulty = difficulty
+        self.rng = np.random.default_rng(seed)
+        self._index = np.arange(n)
+
+        # Table des placements : pour chaque (type, rotation, colonne x), les
+        # 4 masques de lignes deja decales et si la piece tient entre les murs.
+        # Les colonnes -4 et GRID_WIDTH sont hors jeu pour toutes les pieces.
+        self._columns = GRID_WIDTH + 5
+        placements = len(PIECE_TYPES) * 4 * self._columns
+        self._shifted_masks = np.zeros((placements, 4), dtype=np.int64)
+        self._inside = np.zeros(placements, dtype=bool)
+        for t, piece_type in enumerate(PIECE_TYPES):
+            for r, shape in enumerate(ROTATIONS[piece_type]):
+                masks, left, right = SHAPE_MASKS[shape]
+                for c in range(self._columns):
+                    x = c - 4
+                    key = (t * 4 + r) * self._columns + c
+                    self._inside[key] = x + left >= 0 and x + right < GRID_WIDTH
+                    if self._inside[key]:
+                        self._shifted_masks[key, :len(masks)] = [m << x for m in masks]
+        self.spawn_x = np.array([GRID_WIDTH // 2 - len(SHAPES[t][0]) // 2
+                                 for t in PIECE_TYPES], dtype=np.int64)
+
+        # 4 lignes pleines sous chaque plateau servent de sol : une piece qui
+        # le traverse entre en collision comme avec un bloc
+        self._padded = np.zeros((n, GRID_HEIGHT + 4), dtype=np.int64)
+        self._padded[:, GRID_HEIGHT:] = -1
+        self.boards = self._padded[:, :GRID_HEIGHT]
+        self.piece = np.zeros(n, dtype=np.int64)
+        self.next_piece = np.zeros(n, dtype=np.int64)
+        self.rotation = np.zeros(n, dtype=np.int64)
+        self.x = np.zeros(n, dtype=np.int64)
+        self.y = np.zeros(n, dtype=np.int64)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.level = np.ones(n, dtype=np.int64)
+        self.lines = np.zeros(n, dtype=np.int64)
+        self.fall_speed = np.zeros(n)
+        self.done = np.zeros(n, dtype=bool)
+        self.reset()
+
+    def reset(self, mask=None):
+        if mask is None:
+            mask = np.ones(self.n, dtype=bool)
+        count = int(mask.sum())
+        self.boards[mask] = 0
+        self.piece[mask] = self.rng.integers(len(PIECE_TYPES), size=count)
+        self.next_piece[mask] = self.rng.integers(len(PIECE_TYPES), size=count)
+        self.rotation[mask] = 0
+        self.x[mask] = self.spawn_x[self.piece[mask]]
+        self.y[mask] = 0
+        self.score[mask] = 0
+        self.level[mask] = 1
+        self.lines[mask] = 0
+        self.fall_speed[mask] = DIFFICULTIES[self.difficulty]['fall_speed']
+        self.done[mask] = False
+        return self.boards
+
+    def _placement(self, rotation, x, index=None):
+        piece = self.piece if index is None else self.piece[index]
+        return (piece * 4 + rotation) * self._columns + np.clip(x + 4, 0, self._columns - 1)
+
+    def fits(self, rotation, x, y, index=None):
+        # Sur toutes les parties, ou seulement celles de `index`
+        key = self._placement(rotation, x, index)
+        boards = self._index if index is None else index
+        cells = (boards * (GRID_HEIGHT + 4) + y)[:, None] + np.arange(4)
+        hits = self._padded.ravel()[cells] & self._shifted_masks[key]
+        return self._inside[key] & ((hits[:, 0] | hits[:, 1] | hits[:, 2] | hits[:, 3]) == 0)
+
+    def drop_distance(self, index):
+        # Distance de chute des pieces des parties `index` : pour chaque ligne
+        # de la piece, premiere ligne du plateau (ou du sol) qu'elle toucherait
+        board = self._padded[index]
+        shifted = self._shifted_masks[self._placement(self.rotation, self.x)[index]]
+        y = self.y[index]
+        rows = np.arange(GRID_HEIGHT + 4)
+        distance = np.full(len(index), GRID_HEIGHT, dtype=np.int64)
+        for i in range(4):
+            hits = ((board & shifted[:, i, None]) != 0) & (rows >= (y + i)[:, None])
+            first = np.where(hits.any(axis=1), hits.argmax(axis=1) - y - i, GRID_HEIGHT)
+            distance = np.minimum(distance, first)
+        return distance - 1
+
+    def _lock(self, mask):
+        # Pose, lignes, score et piece suivante des seules parties de `mask`
+        reward = np.zeros(self.n, dtype=np.int64)
+        if not mask.any():
+            return reward
+        index = np.flatnonzero(mask)
+        boards = self.boards[index]
+        y = self.y[index]
+        shifted = self._shifted_masks[self._placement(self.rotation[index], self.x[index], index)]
+        for i in range(4):
+            sel = shifted[:, i] != 0
+            boards[sel, y[sel] + i] |= shifted[sel, i]
+
+        # Lignes completes : tri stable qui remonte les lignes pleines, puis
+        # remise a zero d'autant de lignes en haut du plateau
+        full = boards == FULL_ROW
+        cleared = full.sum(axis=1)
+        if cleared.any():
+            order = np.argsort(~full, axis=1, kind='stable')
+            boards = np.take_along_axis(boards, order, axis=1)
+            boards[np.arange(GRID_HEIGHT) < cleared[:, None]] = 0
+            level = self.level[index]
+            reward[index] = cleared * 100 * level
+            self.score[index] += reward[index]
+            lines = self.lines[index] = self.lines[index] + cleared
+            new_level = lines // LINES_PER_LEVEL + 1
+            up = new_level > level
+            self.level[index] = np.where(up, new_level, level)
+            speed_increase = DIFFICULTIES[self.difficulty]['speed_increase']
+            fall_speed = self.fall_speed[index]
+            self.fall_speed[index] = np.where(
+                up, np.maximum(MIN_FALL_SPEED, fall_speed - speed_increase), fall_speed)
+        self.boards[index] = boards
+
+        # Piece suivante ; la partie est perdue si elle ne rentre pas
+        self.piece[index] = self.next_piece[index]
+        self.next_piece[index] = self.rng.integers(len(PIECE_TYPES), size=len(index))
+        self.rotation[index] = 0
+        self.x[index] = self.spawn_x[self.piece[index]]
+        self.y[index] = 0
+        self.done[index] |= ~self.fits(0, self.x[index], 0, index)
+        return reward
+
+    def step(self, actions):
+        # Chaque action n'est testee que sur les parties qui la demandent
+        actions = np.asarray(actions)
+        active = ~self.done
+
+        for action, dx in ((self.LEFT, -1), (self.RIGHT, 1)):
+            index = np.flatnonzero(active & (actions == action))
+            if len(index):
+                x = self.x[index] + dx
+                ok = self.fits(self.rotation[index], x, self.y[index], index)
+                self.x[index[ok]] = x[ok]
+
+        index = np.flatnonzero(active & (actions == self.ROTATE))
+        if len(index):
+            rotated = (self.rotation[index] + 1) % 4
+            ok = self.fits(rotated, self.x[index], self.y[index], index)
+            self.rotation[index[ok]] = rotated[ok]
+
+        index = np.flatnonzero(active & (actions == self.DOWN))
+        if len(index):
+            ok = self.fits(self.rotation[index], self.x[index], self.y[index] + 1, index)
+            self.y[index[ok]] += 1
+
+        dropped = active & (actions == self.DROP)
+        if dropped.any():
+            index = np.flatnonzero(dropped)
+            self.y[index] += self.drop_distance(index)
+
+        falling = active & ~dropped
+        can_fall = self.fits(self.rotation, self.x, self.y + 1)
+        self.y = self.y + (falling & can_fall)
+
+        reward = self._lock(dropped | (falling & ~can_fall))
+        return self.boards, reward, self.done.copy()
+
+# Poids des criteres d'evaluation d'un plateau (heuristique classique)
+AI_WEIGHTS = {'height': -0.51, 'lines': 0.76, 'holes': -0.36, 'bumpiness': -0.18}
+
+
+def _lock_rows(rows, masks, x, y):
+    # Plateau apres pose de la piece et nombre de lignes effacees
+    rows = list(rows)
+    for i, mask in enumerate(masks):
+        if mask:
+            rows[y + i] |= mask << x if x >= 0 else mask >> -x
+    cleared = rows.count(FULL_ROW)
+    if cleared:
+        rows = [0] * cleared + [row for row in rows if row != FULL_ROW]
+    return tuple(rows), cleared
+
+
+def placements(rows, piece_type, rotation, x, y):
+    # Toutes les poses atteignables comme le ferait un joueur : rotations sur
+    # place, deplacements lateraux puis chute. Donne (actions, plateau, lignes).
+    seen = set()
+    for turns in range(4):
+        if turns:
+            rotation = (rotation + 1) % 4
+            masks, left, right = SHAPE_MASKS[ROTATIONS[piece_type][rotation]]
+            if not fits(rows, masks, left, right, x, y):
+                return
+        shape = ROTATIONS[piece_type][rotation]
+        masks, left, right = SHAPE_MASKS[shape]
+        if shape in seen:
+            continue
+        seen.add(shape)
+        for direction, action in ((0, None), (-1, 'left'), (1, 'right')):
+            nx = x + direction
+            while direction == 0 or fits(rows, masks, left, right, nx, y):
+                ny = y
+                while fits(rows, masks, left, right, nx, ny + 1):
+                    ny += 1
+                moves = ['rotate'] * turns + [action] * abs(nx - x) + ['drop']
+                yield (moves,) + _lock_rows(rows, masks, nx, ny)
+                if direction == 0:
+                    break
+                nx += direction
+
+
+def board_value(rows, weights=AI_WEIGHTS):
+    # Hauteur cumulee, trous et irregularite des colonnes (sans les lignes)
+    heights = [0] * GRID_WIDTH
+    seen = holes = 0
+    for i, row in enumerate(rows):
+        new = row & ~seen
+        while new:
+            low = new & -new
+            heights[low.bit_length() - 1] = GRID_HEIGHT - i
+            new ^= low
+        holes += bin(seen & ~row).count('1')
+        seen |= row
+    bumpiness = sum(abs(a - b) for a, b in zip(heights, heights[1:]))
+    return (weights['height'] * sum(heights) + weights['holes'] * holes +
+            weights['bumpiness'] * bumpiness)
+
+
+def search(rows, pieces, weights=AI_WEIGHTS, cache=None):
+    # Meilleure valeur atteignable en posant `pieces` depuis leur apparition ;
+    # None designe une piece inconnue (moyenne sur tous les types). Les
+    # feuilles sont indexees par le plateau seul : un plateau atteint par
+    # des ordres de pose differents n'est evalue qu'une fois.
+    key = (rows, pieces) if pieces else rows
+    if cache is not None:
+        value = cache.get(key)
+        if value is not None:
+            return value
+    if not pieces:
+        value = board_value(rows, weights)
+    elif pieces[0] is None:
+        value = sum(search(rows, (t,) + pieces[1:], weights, cache)
+                    for t in PIECE_TYPES) / len(PIECE_TYPES)
+    else:
+        spawn_x = GRID_WIDTH // 2 - len(SHAPES[pieces[0]][0]) // 2
+        value = max((weights['lines'] * lines + search(after, pieces[1:], weights, cache)
+                     for _, after, lines in placements(rows, pieces[0], 0, spawn_x, 0)),
+                    default=float('-inf'))
+    if cache is not None:
+        cache.put(key, value)
+    return value
+
+
+_WORKER_CACHE = LRUCache(100_000)
+
+def _search_task(rows, pieces, weights):
+    # Execute dans un processus du pool : cache de transposition par processus
+    return search(rows, pieces, weights, _WORKER_CACHE)
+
+
+class Autoplayer:
+    # Joue a la place du joueur : chaque pose de la piece courante est
+    # evaluee (lookahead pieces a l'avance, next_piece comprise) et les
+    # actions de la meilleure sont jouees comme des touches. La recherche
+    # tourne sur un thread a part pour ne pas bloquer la boucle de jeu ;
+    # next_action ne renvoie rien tant qu'elle n'est pas terminee. Le pool
+    # (executor) ne sert qu'a repartir les poses d'une meme recherche : la
+    # recherche tenant le GIL, seul 'process' peut en tirer parti.
+    def __init__(self, lookahead=2, workers=None, executor='none',
+                 cache_size=100_000, weights=None):
+        self.lookahead = lookahead
+        self.weights = dict(weights or AI_WEIGHTS)
+        self.cache = LRUCache(cache_size)
+        self.workers = workers or os.cpu_count() or 1
+        if executor == 'process':
+            self.executor = concurrent.futures.ProcessPoolExecutor(self.workers)
+        elif executor == 'thread':
+            self.executor = concurrent.futures.ThreadPoolExecutor(self.workers)
+        else:
+            self.executor = None
+        self._planner = concurrent.futures.ThreadPoolExecutor(1)
+        self._future = None
+        self._piece = None
+        self._plan = deque()
+
+    def choose(self, game):
+        piece = game.current_piece
+        return self._choose(tuple(game.rows), piece.type, piece.rotation,
+                            piece.x, piece.y, game.next_piece.type)
+
+    def _choose(self, rows, piece_type, rotation, x, y, next_type):
+        rest = (next_type,) + (None,) * max(0, self.lookahead - 2)
+        rest = rest[:self.lookahead - 1]
+        candidates = list(placements(rows, piece_type, rotation, x, y))
+        if not candidates:
+            return ['drop']
+        if self.executor is None:
+            values = [search(after, rest, self.weights, self.cache)
+                      for _, after, _ in candidates]
+        elif isinstance(self.executor, concurrent.futures.ProcessPoolExecutor):
+            values = list(self.executor.map(
+                _search_task, [after for _, after, _ in candidates],
+                [rest] * len(candidates), [self.weights] * len(candidates),
+                chunksize=-(-len(candidates) // self.workers)))
+        else:
+            values = list(self.executor.map(
+                lambda after: search(after, rest, self.weights, self.cache),
+                [after for _, after, _ in candidates]))
+        best = max(range(len(candidates)),
+                   key=lambda i: values[i] + self.weights['lines'] * candidates[i][2])
+        return candidates[best][0]
+
+    def next_action(self, game):
+        if game.current_piece is not self._piece:
+            # La piece est modifiee en place par la partie : la recherche
+            # travaille sur une copie de l'etat
+            piece = self._piece = game.current_piece
+            self._plan = deque()
+            if self._future is not None:
+                self._future.cancel()
+            self._future = self._planner.submit(
+                self._choose, tuple(game.rows), piece.type, piece.rotation,
+                piece.x, piece.y, game.next_piece.type)
+        if self._future is not None:
+            if not self._future.done():
+                return None
+            self._plan = deque(self._future.result())
+            self._future = None
+        return self._plan.popleft() if self._plan else None
+
+    def replan(self):
+        self._piece = None
+
+    def close(self):
+        self._planner.shutdown(cancel_futures=True)
+        if self.executor is not None:
+            self.executor.shutdown()
+
+# Format des replays : en-tete, puis pour chaque entree un varint
+# (delai en ms depuis l'entree precedente << 3 | indice dans INPUTS), puis
+# une fin avec le score et les lignes attendus et le nombre d'entrees.
+REPLAY_MAGIC = b'TTRP'
+REPLAY_VERSION = 1
+_REPLAY_HEADER = struct.Struct('<4sBBQ')    # magic, version, difficulte, graine
+_REPLAY_TRAILER = struct.Struct('<4sQII')   # b'TEND', score, lignes, entrees
+_DIFFICULTY_NAMES = tuple(DIFFICULTIES)
+
+
+@dataclass
+class Replay:
+    seed: int
+    difficulty: str
+    events: List[Tuple[int, str]]   # (delai en ms, entree de INPUTS)
+    score: Optional[int] = None
+    lines: Optional[int] = None
+
+    def to_bytes(self) -> bytes:
+        out = bytearray(_REPLAY_HEADER.pack(
+            REPLAY_MAGIC, REPLAY_VERSION,
+            _DIFFICULTY_NAMES.index(self.difficulty), self.seed))
+        for delay, action in self.events:
+            value = delay << 3 | INPUTS.index(action)
+            while value >= 0x80:
+                out.append(value & 0x7f | 0x80)
+                value >>= 7
+            out.append(value)
+        if self.score is not None:
+            out += _REPLAY_TRAILER.pack(b'TEND', self.score, self.lines, len(self.events))
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Replay':
+        magic, version, difficulty, seed = _REPLAY_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError('Not a Tetris replay')
+        end, score, lines = len(data), None, None
+        if len(data) >= _REPLAY_HEADER.size + _REPLAY_TRAILER.size:
+            tag, trailer_score, trailer_lines, count = _REPLAY_TRAILER.unpack_from(
+                data, len(data) - _REPLAY_TRAILER.size)
+            if tag == b'TEND':
+                end, score, lines = len(data) - _REPLAY_TRAILER.size, trailer_score, trailer_lines
+        events = []
+        value = shift = 0
+        for byte in data[_REPLAY_HEADER.size:end]:
+            value |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                events.append((value >> 3, INPUTS[value & 7]))
+                value = shift = 0
+        if score is not None and count != len(events):
+            raise ValueError('Truncated Tetris replay')
+        return cls(seed, _DIFFICULTY_NAMES[difficulty], events, score, lines)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path) -> 'Replay':
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
+class ReplayRecorder:
+    def __init__(self, seed, difficulty, path=None):
+        self.replay = Replay(seed, difficulty, [])
+        self.path = path
+        self._last = time.perf_counter()
+
+    def record(self, action):
+        now = time.perf_counter()
+        self.replay.events.append((int((now - self._last) * 1000), action))
+        self._last = now
+
+    def finish(self, game) -> Replay:
+        self.replay.score = game.score
+        self.replay.lines = game.lines
+        if self.path:
+            self.replay.save(self.path)
+        return self.replay
+
+
+class ReplayPlayer:
+    # Relecture sans affichage, aussi vite que possible. Un instantane est
+    # garde toutes les `snapshot_interval` entrees : seek() repart du plus
+    # proche au lieu de rejouer la partie depuis le debut.
+    def __init__(self, replay, snapshot_interval=256):
+        self.replay = replay
+        self.snapshot_interval = snapshot_interval
+        self.game = TetrisEngine(replay.difficulty, random.Random(replay.seed))
+        self.position = 0
+        self.snapshots = [self.game.snapshot()]
+
+    def step(self):
+        self.game.handle_input(self.replay.events[self.position][1])
+        self.position += 1
+        if (self.position % self.snapshot_interval == 0 and
+                len(self.snapshots) == self.position // self.snapshot_interval):
+            self.snapshots.append(self.game.snapshot())
+
+    def seek(self, position):
+        position = max(0, min(position, len(self.replay.events)))
+        index = min(position // self.snapshot_interval, len(self.snapshots) - 1)
+        if not index * self.snapshot_interval <= self.position <= position:
+            self.game.restore(self.snapshots[index])
+            self.position = index * self.snapshot_interval
+        while self.position < position:
+            self.step()
+        return self.game
 
     def run(self):
-        fall_time = 0
-        
+        return self.seek(len(self.replay.events))
+
+
+def verify_replay(path):
+    # (chemin, score attendu, score rejoue) d'un replay rejoue sans affichage
+    replay = Replay.load(path)
+    game = ReplayPlayer(replay).run()
+    return path, (replay.score, replay.lines), (game.score, game.lines)
+
+
+def verify_replays(paths, workers=None):
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(verify_replay, paths, chunksize=16))
+
+
+# Mode versus. Trames : longueur '<H' puis la charge utile, dont le premier
+# octet donne le type. Le serveur fait foi : les clients envoient leurs
+# entrees et recoivent, pour chaque plateau, seulement ce qui a change.
+_FRAME = struct.Struct('<H')
+_JOIN = struct.Struct('<cB')            # b'J', difficulte
+_INPUT = struct.Struct('<cB')           # b'I', indice dans INPUTS
+_START = struct.Struct('<cBHH')         # b'S', numero du joueur, largeur, hauteur
+# b'D', numero du joueur, score, lignes, niveau, piece, rotation, piece
+# suivante, x, y, fin de partie, nombre de lignes modifiees suivies chacune
+# de son indice '<H' et de ses `largeur` couleurs. La meme trame part aux
+# deux joueurs.
+_DELTA = struct.Struct('<cBIHHBBBhhBH')
+_ROW_INDEX = struct.Struct('<H')
+_END = struct.Struct('<cB')             # b'E', numero du gagnant
+# Lignes de dechets envoyees a l'adversaire selon le nombre de lignes effacees
+GARBAGE_LINES = {2: 1, 3: 2, 4: 4}
+# Octets en attente d'envoi au-dela desquels le serveur deconnecte un client
+# qui ne lit plus ses trames
+VERSUS_WRITE_LIMIT = 256 * 1024
+
+
+def _frame(payload):
+    return _FRAME.pack(len(payload)) + payload
+
+
+def _split_frames(buffer):
+    # Trames completes de `buffer` (bytearray), retirees au passage
+    frames = []
+    while len(buffer) >= _FRAME.size:
+        size = _FRAME.unpack_from(buffer)[0]
+        if len(buffer) < _FRAME.size + size:
+            break
+        frames.append(bytes(buffer[_FRAME.size:_FRAME.size + size]))
+        del buffer[:_FRAME.size + size]
+    return frames
+
+
+class VersusEngine(TetrisEngine):
+    # Partie d'un joueur en versus : effacer deux lignes ou plus envoie des
+    # lignes de dechets a l'adversaire, qui les recoit a sa prochaine piece
+    # posee, apres annulation par ses propres attaques.
+    def __init__(self, difficulty='medium', rng=None):
+        self.opponent = None
+        self.incoming = 0
+        self.garbage_rng = random.Random()
+        super().__init__(difficulty, rng)
+
+    def clear_lines(self, touched=None):
+        lines = self.lines
+        super().clear_lines(touched)
+        attack = GARBAGE_LINES.get(self.lines - lines, 0)
+        cancelled = min(attack, self.incoming)
+        self.incoming -= cancelled
+        if self.opponent and attack > cancelled:
+            self.opponent.incoming += attack - cancelled
+        if self.incoming:
+            self.add_garbage(self.incoming)
+            self.incoming = 0
+
+    def add_garbage(self, count):
+        # Pousse la pile vers le haut de `count` lignes pleines a un trou pres
+        hole = self.garbage_rng.randrange(self.width)
+        row = ((1 << self.width) - 1) & ~(1 << hole)
+        colors = bytes(0 if j == hole else GARBAGE for j in range(self.width))
+        if any(self.rows[:count]):
+            self.game_over = True
+            self.notify('game_over')
+        self.rows = self.rows[count:] + [row] * count
+        self.colors = self.colors[count:] + [colors] * count
+        self._rebuild_index()
+        self.version += 1
+
+
+def encode_delta(number, game, sent):
+    # Trame b'D' de la partie du joueur `number` ; `sent` (liste des lignes de couleurs
+    # deja envoyees) est mis a jour. Les lignes etant des bytes partages,
+    # une ligne inchangee est le meme objet.
+    changed = [i for i, (row, old) in enumerate(zip(game.colors, sent))
+               if row is not old and row != old]
+    piece = game.current_piece
+    out = bytearray(_DELTA.pack(
+        b'D', number, game.score, game.lines, game.level, PIECE_INDEX[piece.type],
+        piece.rotation, PIECE_INDEX[game.next_piece.type], piece.x, piece.y,
+        game.game_over, len(changed)))
+    for i in changed:
+        out += _ROW_INDEX.pack(i)
+        out += game.colors[i]
+        sent[i] = game.colors[i]
+    return _frame(bytes(out))
+
+
+def apply_delta(game, payload):
+    # Applique une trame b'D' a une partie miroir ; retourne le numero du joueur
+    (_, number, game.score, game.lines, game.level, piece_type, rotation, next_type,
+     x, y, game_over, count) = _DELTA.unpack_from(payload)
+    offset = _DELTA.size
+    for _ in range(count):
+        i = _ROW_INDEX.unpack_from(payload, offset)[0]
+        offset += _ROW_INDEX.size
+        row = payload[offset:offset + game.width]
+        offset += game.width
+        game.colors[i] = row
+        game.rows[i] = int(row[::-1].translate(_CELL_BITS), 2)
+    if count:
+        game._rebuild_index()
+    piece_type = PIECE_TYPES[piece_type - 1]
+    game.current_piece = Piece(ROTATIONS[piece_type][rotation], x, y, piece_type, rotation)
+    game.next_piece = game._spawn(PIECE_TYPES[next_type - 1])
+    game.game_over = bool(game_over)
+    game.version += 1
+    return number
+
+
+class _VersusPlayer:
+    def __init__(self, writer, game):
+        self.writer = writer
+        self.game = game
+        self.fall_time = 0.0
+        self.connected = True
+        # Lignes et version de ce plateau deja envoyees aux deux joueurs
+        self.sent = [game._empty_row] * game.height
+        self.sent_version = None
+
+
+class VersusServer:
+    # Serveur asyncio : les joueurs sont apparies deux par deux et chacun a
+    # une partie (VersusEngine) faisant foi. Les entrees sont appliquees a
+    # reception ; a chaque tick, la gravite avance et les changements sont
+    # envoyes. self.stats['tick'] mesure la duree de chaque tick.
+    def __init__(self, tick_rate=TICK_RATE):
+        self.tick_rate = tick_rate
+        self.waiting = None
+        self.matches = []
+        self.stats = FrameStats(frame_budget=1 / tick_rate)
+
+    async def handle(self, reader, writer):
+        # Connexion d'un joueur, jusqu'a la fin de sa partie
+        player = None
+        try:
+            payload = await self._read(reader)
+            kind, difficulty = _JOIN.unpack(payload)
+            if kind != b'J':
+                return
+            player = _VersusPlayer(writer, VersusEngine(_DIFFICULTY_NAMES[difficulty]))
+            if self.waiting is None or not self.waiting.connected:
+                self.waiting = player
+            else:
+                self._start(self.waiting, player)
+                self.waiting = None
+            while True:
+                kind, index = _INPUT.unpack(await self._read(reader))
+                action = INPUTS[index]
+                # Rien avant le debut de la partie : sans gravite, un joueur en
+                # attente pourrait preparer sa pile
+                if (kind == b'I' and action in ACTIONS and player.game.opponent is not None
+                        and not player.game.game_over):
+                    player.game.apply_action(action)
+        except (asyncio.IncompleteReadError, ConnectionError, struct.error, IndexError):
+            pass
+        finally:
+            if player:
+                player.connected = False
+            writer.close()
+
+    @staticmethod
+    async def _read(reader):
+        size = _FRAME.unpack(await reader.readexactly(_FRAME.size))[0]
+        return await reader.readexactly(size)
+
+    def _start(self, first, second):
+        first.game.opponent, second.game.opponent = second.game, first.game
+        for number, player in enumerate((first, second)):
+            game = player.game
+            self._send(player, _frame(_START.pack(b'S', number, game.width, game.height)))
+        self.matches.append((first, second))
+
+    @staticmethod
+    def _send(player, data):
+        # Ecriture sans attente ; un client trop lent est deconnecte plutot
+        # que de laisser grossir son tampon d'envoi
+        if not player.connected:
+            return
+        player.writer.write(data)
+        if player.writer.transport.get_write_buffer_size() > VERSUS_WRITE_LIMIT:
+            player.connected = False
+            player.writer.transport.abort()
+
+    def tick(self, dt):
+        # Gravite puis, pour chaque partie, une seule ecriture par joueur
+        # avec les changements des deux plateaux
+        start = time.perf_counter()
+        finished = []
+        for match in self.matches:
+            for player in match:
+                game = player.game
+                if not game.game_over:
+                    player.fall_time += dt
+                    if player.fall_time >= game.fall_speed:
+                        player.fall_time -= game.fall_speed
+                        game.gravity()
+            out = b''
+            for number, player in enumerate(match):
+                if player.sent_version != player.game.version:
+                    player.sent_version = player.game.version
+                    out += encode_delta(number, player.game, player.sent)
+            first, second = match
+            if out:
+                for player in match:
+                    self._send(player, out)
+            if (not first.connected or not second.connected or
+                    first.game.game_over or second.game.game_over):
+                finished.append(match)
+        for match in finished:
+            self.matches.remove(match)
+            first = match[0]
+            winner = 1 if first.game.game_over or not first.connected else 0
+            for player in match:
+                if player.connected:
+                    self._send(player, _frame(_END.pack(b'E', winner)))
+                    player.writer.close()
+        self.stats.add('tick', time.perf_counter() - start)
+
+    async def run(self, host='127.0.0.1', port=0, started=None):
+        # Sert jusqu'a annulation ; started(port) est appele une fois a l'ecoute
+        server = await asyncio.start_server(self.handle, host, port)
+        if started:
+            started(server.sockets[0].getsockname()[1])
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.tick_rate
+        due = loop.time()
+        async with server:
+            while True:
+                self.tick(interval)
+                due += interval
+                await asyncio.sleep(max(0.0, due - loop.time()))
+
+
+class VersusClient:
+    # Client leger : envoie les touches et affiche avec TetrisUI la partie que
+    # decrit le serveur, sans rien simuler. L'adversaire est resume dans le
+    # titre de la fenetre.
+    def __init__(self, host, port, difficulty='medium', screen=None, das=DAS, arr=ARR):
+        self.sock = socket.create_connection((host, port))
+        self.sock.sendall(_frame(_JOIN.pack(b'J', _DIFFICULTY_NAMES.index(difficulty))))
+        self.sock.setblocking(False)
+        self.boards = (TetrisEngine(difficulty), TetrisEngine(difficulty))
+        self.ui = game_ui(self.boards[0], screen=screen)
+        self.clock = pygame.time.Clock()
+        self.input = InputHandler(das, arr)
+        self.number = None
+        self.playing = False
+        self.result = 'Waiting for an opponent'
+        self.outgoing = bytearray()  # entrees pas encore acceptees par le socket
+
+    def run(self):
+        buffer = bytearray()
         while True:
-            self.clock.tick(60)
-            if not self.paused:
-                fall_time += self.clock.get_rawtime()
-            
+            self.clock.tick(TICK_RATE)
+            now = time.perf_counter()
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
-                    pygame.quit()
+                    self.sock.close()
                     return
+                if event.type in (pygame.KEYDOWN, pygame.KEYUP):
+                    action = KEY_ACTIONS.get(pygame.key.name(event.key))
+                    if action and event.type == pygame.KEYUP:
+                        self.input.release(action, now)
+                    elif action and self.playing:
+                        self.input.press(action, now)
+            actions = self.input.due(now)
+            if actions and self.playing:
+                for _, action in actions:
+                    self.outgoing += _frame(_INPUT.pack(b'I', INPUTS.index(action)))
+            if self.outgoing:
+                # Envoi partiel possible : le reste part aux tours suivants
+                try:
+                    del self.outgoing[:self.sock.send(self.outgoing)]
+                except BlockingIOError:
+                    pass
+                except OSError:
+                    self.outgoing.clear()
+                    self.playing = False
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                data = None
+            except OSError:
+                data = b''
+            if data == b'':
+                self.playing = False
+            elif data:
+                buffer += data
+                for payload in _split_frames(buffer):
+                    self.handle(payload)
+            opponent = self.boards[1]
+            pygame.display.set_caption(
+                f'Tetris versus - {self.result} - opponent {opponent.score} / {opponent.lines} lines')
+            self.ui.draw()
+
+    def handle(self, payload):
+        kind = payload[:1]
+        if kind == b'S':
+            _, self.number, width, height = _START.unpack(payload)
+            self.boards = tuple(TetrisEngine(board.difficulty, None, width, height)
+                                for board in self.boards)
+            self.ui.game = self.boards[0]
+            self.ui.set_zoom(self.ui.cell)
+            self.playing = True
+            self.result = 'Playing'
+        elif kind == b'D':
+            apply_delta(self.boards[0 if payload[1] == self.number else 1], payload)
+        elif kind == b'E':
+            self.result = 'You win' if _END.unpack(payload)[1] == self.number else 'You lose'
+            self.playing = False
+            self.boards[0].game_over = True
+            self.boards[0].version += 1
+
+
+async def _versus_bot(port, seconds, rng):
+    # Joueur aleatoire : une entree toutes les 100 ms environ, et une autre
+    # partie des que la precedente se termine
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(_frame(_JOIN.pack(b'J', 1)))
+
+        async def drain():
+            with contextlib.suppress(ConnectionError):
+                while await reader.read(65536):
+                    pass
+        receiving = asyncio.ensure_future(drain())
+        try:
+            while time.perf_counter() < deadline and not receiving.done():
+                action = rng.choice(ACTIONS[1:])
+                writer.write(_frame(_INPUT.pack(b'I', INPUTS.index(action))))
+                await asyncio.sleep(rng.uniform(0.05, 0.15))
+        finally:
+            writer.close()
+            await receiving
+
+
+def versus_load(matches, seconds=10.0):
+    # Serveur et 2 * `matches` joueurs aleatoires dans le meme processus sur
+    # localhost ; retourne le resume des durees de tick du serveur
+    server = VersusServer()
+
+    async def run():
+        started = asyncio.get_running_loop().create_future()
+        serving = asyncio.ensure_future(server.run(started=started.set_result))
+        port = await started
+        rng = random.Random(0)
+        await asyncio.gather(*(_versus_bot(port, seconds, random.Random(rng.random()))
+                               for _ in range(2 * matches)))
+        serving.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await serving
+    asyncio.run(run())
+    return server.stats.summary()['tick']
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class FrameStats:
+    # Durees des images, des ticks de simulation, intervalles entre deux
+    # chutes automatiques et delais entre une entree et l'image qui montre
+    # son effet, sur les `size` dernieres mesures
+    def __init__(self, frame_budget=1 / FRAME_RATE, size=3600):
+        self.frame_budget = frame_budget
+        self.series = {name: deque(maxlen=size)
+                       for name in ('frame', 'tick', 'gravity', 'input')}
+        self.dropped_frames = 0
+
+    def add(self, name, seconds):
+        self.series[name].append(seconds)
+        if name == 'frame' and seconds > self.frame_budget:
+            self.dropped_frames += int(seconds / self.frame_budget + 0.5) - 1
+
+    def summary(self):
+        return {
+            name: {
+                'count': len(values),
+                'mean_ms': sum(values) / len(values) * 1000 if values else 0.0,
+                'p50_ms': _percentile(values, 0.5) * 1000 if values else 0.0,
+                'p99_ms': _percentile(values, 0.99) * 1000 if values else 0.0,
+                'max_ms': max(values) * 1000 if values else 0.0,
+            }
+            for name, values in self.series.items()
+        }
+
+    def report(self):
+        lines = [f'{"":<8} {"count":>7} {"mean ms":>8} {"p50 ms":>8} {"p99 ms":>8} {"max ms":>8}']
+        for name, row in self.summary().items():
+            lines.append(f'{name:<8} {row["count"]:>7} {row["mean_ms"]:8.2f} {row["p50_ms"]:8.2f} '
+                         f'{row["p99_ms"]:8.2f} {row["max_ms"]:8.2f}')
+        lines.append(f'dropped frames: {self.dropped_frames}')
+        return '\n'.join(lines)
+
+
+class InputHandler:
+    # Entrees horodatees a la lecture des evenements. Une touche de
+    # deplacement maintenue se repete apres `das` s puis toutes les `arr` s ;
+    # entre gauche et droite, la derniere enfoncee l'emporte. due() rend les
+    # appuis et repetitions echus, dans l'ordre chronologique.
+    REPEATED = ('left', 'right', 'down')
+    OPPOSITE = {'left': 'right', 'right': 'left'}
+
+    def __init__(self, das=DAS, arr=ARR):
+        if das < 0 or arr <= 0:
+            raise ValueError(f'DAS must be >= 0 and ARR > 0, got {das!r} / {arr!r}')
+        self.das = das
+        self.arr = arr
+        self.queue = []
+        self.held = {}  # action -> instant de la prochaine repetition
+
+    def reset(self):
+        # Les relachements survenus hors de la scene de jeu sont perdus
+        self.queue.clear()
+        self.held.clear()
+
+    def press(self, action, stamp):
+        self.queue.append((stamp, action))
+        if action in self.REPEATED:
+            self.held.pop(action, None)
+            self.held[action] = stamp + (self.das or self.arr)
+
+    def release(self, action, stamp):
+        if self.held.pop(action, None) is not None:
+            # L'autre direction, toujours tenue, repart apres un nouveau delai
+            other = self.OPPOSITE.get(action)
+            if other in self.held:
+                self.held[other] = stamp + self.das
+
+    def due(self, now):
+        events = self.queue
+        self.queue = []
+        horizontal = [action for action in self.held if action in self.OPPOSITE]
+        for action, next_time in self.held.items():
+            if action in self.OPPOSITE and action != horizontal[-1]:
+                continue
+            # Apres un long blocage, le retard n'est pas rattrape
+            next_time = max(next_time, now - MAX_FRAME_TIME)
+            while next_time <= now:
+                events.append((next_time, action))
+                next_time += self.arr
+            self.held[action] = next_time
+        events.sort(key=lambda event: event[0])
+        return events
+
+
+class Tetris(TetrisEngine):
+    def __init__(self, difficulty='medium', rng=None, autoplayer=None, recorder=None,
+                 render='throttle', width=GRID_WIDTH, height=GRID_HEIGHT, screen=None,
+                 das=DAS, arr=ARR):
+        super().__init__(difficulty, rng, width, height, history=True)
+        self.autoplayer = autoplayer
+        self.recorder = recorder
+        self.render = render
+        self.stats = FrameStats()
+        self.input = InputHandler(das, arr)
+        self.clock = pygame.time.Clock()
+        self.add_observer(play_sound)
+        self.ui = game_ui(self, vsync=render == 'vsync', screen=screen)
+        button_x = (SCREEN_WIDTH - 300) // 2
+        self.game_over_buttons = {
+            'restart': Button(button_x, 400, 300, 60, 'Restart',
+                              COLORS['button_difficulty']['medium']),
+            'quit': Button(button_x, 480, 300, 60, 'Quit',
+                           COLORS['button_difficulty']['hard'])
+        }
+
+    def new_game(self, difficulty, rng, recorder=None):
+        # Nouvelle partie dans la meme interface, sans rien recreer
+        super().new_game(difficulty, rng)
+        self.recorder = recorder
+        self.ui.invalidate()
+        if self.autoplayer:
+            self.autoplayer.replan()
+
+    def view_key(self, key):
+        # Touches d'affichage, actives en jeu comme en pause
+        if key == pygame.K_F3:
+            PROFILER.toggle_overlay()
+        elif key in (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS):
+            self.ui.zoom(1)
+        elif key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+            self.ui.zoom(-1)
+        else:
+            return False
+        return True
+
+    def run(self):
+        # Scene de jeu. Boucle a pas fixe : le temps ecoule s'accumule et la
+        # simulation avance d'autant de ticks de 1 / TICK_RATE s ; l'affichage
+        # suit au rythme choisi (self.render) sans ralentir la chute. Les
+        # evenements sont lus a chaque tour, au rythme des ticks et non des
+        # images, et les entrees echues appliquees dans l'ordre avant la chute.
+        # Retourne la scene suivante : 'paused', 'game_over' ou None pour quitter.
+        pygame.display.set_caption('Tetris')
+        tick = 1 / TICK_RATE
+        frame_interval = 1 / FRAME_RATE if self.render == 'throttle' else 0.0
+        fall_time = 0.0
+        accumulator = 0.0
+        last_gravity = None
+        previous = time.perf_counter()
+        last_frame = previous - frame_interval
+        changed = None  # horodatage de la plus ancienne entree pas encore affichee
+        self.input.reset()
+        
+        while True:
+            if self.render == 'throttle':
+                self.clock.tick(TICK_RATE)
+            now = time.perf_counter()
+            accumulator += min(now - previous, MAX_FRAME_TIME)
+            previous = now
+            frame_due = now - last_frame >= frame_interval - tick / 2
+            if frame_due:
+                PROFILER.next_frame()
+            
+            with PROFILER.section('events'):
+                events = pygame.event.get()
+            
+            with PROFILER.section('input'):
+                for event in events:
+                    if event.type == pygame.QUIT:
+                        self.save_recording()
+                        return None
+                    
+                    if event.type == pygame.MOUSEWHEEL:
+                        self.ui.zoom(event.y)
+                    
+                    if event.type == pygame.MOUSEMOTION:
+                        for button in self.ui.buttons.values():
+                            button.is_hovered(event.pos)
+                    
+                    if event.type == pygame.MOUSEBUTTONDOWN:
+                        for name, button in self.ui.buttons.items():
+                            if button.is_hovered(event.pos):
+                                if name == 'pause':
+                                    self.perform('pause')
+                                    return 'paused'
+                                elif name == 'restart':
+                                    self.perform('restart')
+                                elif name == 'quit':
+                                    self.save_recording()
+                                    return None
+                    if event.type == pygame.KEYUP:
+                        action = KEY_ACTIONS.get(pygame.key.name(event.key))
+                        if action:
+                            self.input.release(action, now)
+                    if event.type == pygame.KEYDOWN:
+                        action = KEY_ACTIONS.get(pygame.key.name(event.key))
+                        if self.view_key(event.key):
+                            pass
+                        # Contrôles du jeu uniquement si pas en pause et pas game over
+                        elif not self.paused and not self.game_over:
+                            if action:
+                                self.input.press(action, now)
+                            elif event.key == pygame.K_a:
+                                self.toggle_autoplayer()
+                            elif event.key in (pygame.K_z, pygame.K_y):
+                                self.undo(-1 if event.key == pygame.K_z else 1)
                 
+                # Appuis et repetitions, dans l'ordre, dans le meme tick
+                for stamp, action in self.input.due(now):
+                    if self.paused or self.game_over:
+                        break
+                    if self.perform(action) and changed is None:
+                        changed = stamp
+            
+            # Joueur automatique : une action par image, comme une touche
+            if frame_due and self.autoplayer and not self.paused and not self.game_over:
+                with PROFILER.section('autoplayer'):
+                    action = self.autoplayer.next_action(self)
+                    if action and not self.perform(action):
+                        self.autoplayer.replan()
+            
+            with PROFILER.section('gravity'):
+                while accumulator >= tick:
+                    accumulator -= tick
+                    tick_start = time.perf_counter()
+                    # Chute automatique si pas en pause et pas game over
+                    if not self.paused and not self.game_over:
+                        fall_time += tick
+                        if fall_time >= self.fall_speed:
+                            fall_time -= self.fall_speed
+                            self.perform('gravity')
+                            if last_gravity is not None:
+                                self.stats.add('gravity', tick_start - last_gravity)
+                            last_gravity = tick_start
+                    else:
+                        last_gravity = None
+                    self.stats.add('tick', time.perf_counter() - tick_start)
+            
+            # Dessiner l'interface ; sans image a presenter, rien n'attend la
+            # synchronisation verticale et la boucle est cadencee a TICK_RATE
+            if frame_due:
+                with PROFILER.section('draw'):
+                    presented = self.ui.draw()
+                self.stats.add('frame', now - last_frame)
+                last_frame = now
+                if presented and changed is not None:
+                    self.stats.add('input', time.perf_counter() - changed)
+                    changed = None
+                if not presented and self.render == 'vsync':
+                    self.clock.tick(TICK_RATE)
+            
+            # Game over
+            if self.game_over:
+                break
+        
+        self.save_recording()
+        return 'game_over'
+
+    def pause_screen(self):
+        # Scene de pause : la partie est figee, seuls les boutons et les
+        # touches d'affichage repondent. Attente bloquante des evenements ;
+        # ui.draw ne redessine que ce qui a change. Retourne 'playing' ou None.
+        while True:
+            self.ui.draw()
+            for event in wait_events(self.ui.idle_timeout()):
+                if event.type == pygame.QUIT:
+                    self.save_recording()
+                    return None
+                if event.type in (pygame.WINDOWEXPOSED, pygame.WINDOWSIZECHANGED):
+                    self.ui.invalidate()
                 if event.type == pygame.MOUSEMOTION:
                     for button in self.ui.buttons.values():
                         button.is_hovered(event.pos)
-                
                 if event.type == pygame.MOUSEBUTTONDOWN:
                     for name, button in self.ui.buttons.items():
                         if button.is_hovered(event.pos):
-                            if name == 'pause':
-                                self.paused = not self.paused
-                            elif name == 'restart':
-                                self.reset_game()
-                            elif name == 'quit':
-                                pygame.quit()
-                                return    
+                            if name == 'quit':
+                                self.save_recording()
+                                return None
+                            # Reprise ou redemarrage : la partie repart
+                            self.perform(name)
+                            return 'playing'
                 if event.type == pygame.KEYDOWN:
-                    # Contrôles du jeu uniquement si pas en pause et pas game over
-                    if not self.paused and not self.game_over:
-                        if event.key == pygame.K_LEFT:
-                            if self.is_valid_move(self.current_piece.shape,
-                                               self.current_piece.x - 1,
-                                               self.current_piece.y):
-                                self.current_piece.x -= 1
-                                SOUNDS['lateral_move'].play()
-                        elif event.key == pygame.K_RIGHT:
-                            if self.is_valid_move(self.current_piece.shape,
-                                               self.current_piece.x + 1,
-                                               self.current_piece.y):
-                                self.current_piece.x += 1
-                                SOUNDS['lateral_move'].play()
-                        elif event.key == pygame.K_DOWN:
-                            if self.is_valid_move(self.current_piece.shape,
-                                               self.current_piece.x,
-                                               self.current_piece.y + 1):
-                                self.current_piece.y += 1
-                                SOUNDS['drop'].play()
-                        elif event.key == pygame.K_UP:
-                            self.rotate_piece()
-                            SOUNDS['rotate'].play()
-                        elif event.key == pygame.K_SPACE:
-                            while self.is_valid_move(self.current_piece.shape,
-                                                  self.current_piece.x,
-                                                  self.current_piece.y + 1):
-                                self.current_piece.y += 1
-                            self.place_piece()
-                            SOUNDS['drop'].play()
-            
-            # Chute automatique si pas en pause et pas game over
-            if fall_time >= self.fall_speed * 1000 and not self.paused and not self.game_over:
-                fall_time = 0
-                if self.is_valid_move(self.current_piece.shape,
-                                   self.current_piece.x,
-                                   self.current_piece.y + 1):
-                    self.current_piece.y += 1
-                else:
-                    self.place_piece()
-            
-            # Dessiner l'interface
+                    self.view_key(event.key)
+
+    def undo(self, pieces):
+        # Z annule la derniere piece, Y la retablit. Un replay ne sait pas
+        # representer un retour en arriere : inactif pendant un enregistrement.
+        if self.recorder or not self.rewind(pieces):
+            return False
+        if self.autoplayer:
+            self.autoplayer.replan()
+        return True
+
+    def perform(self, action):
+        # Entree de INPUTS appliquee par la boucle de jeu, et enregistree
+        if self.recorder:
+            self.recorder.record(action)
+        return self.handle_input(action)
+
+    def save_recording(self):
+        if self.recorder:
+            self.recorder.finish(self)
+
+    def play_replay(self, replay):
+        # Relecture en temps reel dans l'interface
+        start = time.perf_counter()
+        due = 0.0
+        for delay, action in replay.events:
+            due += delay / 1000
+            while time.perf_counter() - start < due:
+                self.clock.tick(FRAME_RATE)
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        return
+                self.ui.draw()
+            self.handle_input(action)
+        # Fin du replay : le plateau final reste affiche jusqu'a la fermeture
+        while True:
             self.ui.draw()
-            
-            # Game over
-            if self.game_over:
-                SOUNDS['game_over'].play()
-                break
-        
-        # Écran de Game Over avec option de redémarrage
-        self.game_over_screen()
+            for event in wait_events(self.ui.idle_timeout()):
+                if event.type == pygame.QUIT:
+                    return
+                if event.type in (pygame.WINDOWEXPOSED, pygame.WINDOWSIZECHANGED):
+                    self.ui.invalidate()
+
+    def toggle_autoplayer(self):
+        if self.autoplayer:
+            self.autoplayer.close()
+            self.autoplayer = None
+        elif (self.width, self.height) == (GRID_WIDTH, GRID_HEIGHT):
+            # La recherche suppose le plateau standard, comme --ai
+            self.autoplayer = Autoplayer()
 
     def game_over_screen(self):
-        screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        # Scene de fin de partie, au repos comme le menu : redessinee
+        # seulement au survol d'un bouton. Retourne 'select' pour rejouer ou None.
         pygame.display.set_caption('Game Over')
         
-        font_large = pygame.font.Font(None, 72)
-        font_medium = pygame.font.Font(None, 48)
-        
         # Boutons
-        restart_button = Button(
-            (SCREEN_WIDTH - 300) // 2, 400, 300, 60, 
-            'Restart', COLORS['button_difficulty']['medium']
-        )
-        quit_button = Button(
-            (SCREEN_WIDTH - 300) // 2, 480, 300, 60, 
-            'Quit', COLORS['button_difficulty']['hard']
-        )
+        restart_button = self.game_over_buttons['restart']
+        quit_button = self.game_over_buttons['quit']
         
-        running = True
-        while running:
-            screen.fill(COLORS['background'])
-            
-            # Game Over
-            game_over_text = font_large.render('Game Over', True, COLORS['text'])
-            game_over_rect = game_over_text.get_rect(center=(SCREEN_WIDTH // 2, 200))
-            screen.blit(game_over_text, game_over_rect)
-            
-            # Score final
-            score_text = font_medium.render(f'Score: {self.score}', True, COLORS['text'])
-            score_rect = score_text.get_rect(center=(SCREEN_WIDTH // 2, 300))
-            screen.blit(score_text, score_rect)
-            
-            # Dessiner les boutons
-            restart_button.draw(screen)
-            quit_button.draw(screen)
-            
-            pygame.display.flip()
+        dirty = True
+        while True:
+            if dirty:
+                self.draw_game_over()
+                dirty = False
             
-            for event in pygame.event.get():
+            for event in wait_events():
                 if event.type == pygame.QUIT:
-                    pygame.quit()
-                    return
+                    return None
+                
+                if event.type in (pygame.WINDOWEXPOSED, pygame.WINDOWSIZECHANGED):
+                    dirty = True
                 
                 if event.type == pygame.MOUSEMOTION:
-                    restart_button.is_hovered(event.pos)
-                    quit_button.is_hovered(event.pos)
+                    dirty |= hover((restart_button, quit_button), event.pos)
                 
                 if event.type == pygame.MOUSEBUTTONDOWN:
                     if restart_button.is_hovered(event.pos):
-                        SOUNDS['start'].play()
-                        return main()
+                        AUDIO.play('start')
+                        return 'select'
                     if quit_button.is_hovered(event.pos):
-                        pygame.quit()
-                        return
+                        return None
+
+    def draw_game_over(self):
+        screen = self.ui.screen
+        screen.fill(COLORS['background'])
+        
+        # Game Over
+        game_over_text = TEXT_CACHE.render('Game Over', 72)
+        game_over_rect = game_over_text.get_rect(center=(SCREEN_WIDTH // 2, 200))
+        screen.blit(game_over_text, game_over_rect)
+        
+        # Score final
+        score_text = TEXT_CACHE.render(f'Score: {self.score}', 48)
+        score_rect = score_text.get_rect(center=(SCREEN_WIDTH // 2, 300))
+        screen.blit(score_text, score_rect)
+        
+        # Dessiner les boutons
+        for button in self.game_over_buttons.values():
+            button.draw(screen)
+        
+        present(screen)
 
-def main():
-    # Écran de sélection de difficulté
-    difficulty_select = DifficultySelect()
-    difficulty = difficulty_select.run()
+
+class Session:
+    # Cycle de vie du processus : une fenetre, un jeu de ressources et une
+    # partie reutilises d'une scene a l'autre. Chaque scene retourne le nom
+    # de la suivante (None pour quitter) ; rien ne se rappelle recursivement.
+    SCENES = ('select', 'playing', 'paused', 'game_over')
+
+    def __init__(self, args, on_first_frame=None):
+        self.args = args
+        self.screen = open_display(args.render == 'vsync', args.display, args.fullscreen,
+                                   args.scale or 'smooth')
+        self.select = DifficultySelect(self.screen)
+        self.game = None
+        self.scene = 'select'
+        self.on_first_frame = on_first_frame
+
+    def run(self):
+        while self.scene:
+            self.scene = self.step()
+        if self.game and self.game.autoplayer:
+            self.game.autoplayer.close()
+
+    def step(self):
+        # Joue la scene courante et retourne la suivante
+        if self.scene not in self.SCENES:
+            raise ValueError(f'Unknown scene: {self.scene!r}')
+        if self.scene == 'select':
+            difficulty = self.select.run(self.on_first_frame)
+            self.on_first_frame = None
+            if not difficulty:
+                return None
+            AUDIO.play('start')
+            self.start_game(difficulty)
+            return 'playing'
+        elif self.scene == 'playing':
+            return self.game.run()
+        elif self.scene == 'paused':
+            return self.game.pause_screen()
+        return self.game.game_over_screen()
+
+    def start_game(self, difficulty):
+        args = self.args
+        seed = args.seed if args.seed is not None else random.randrange(2 ** 63)
+        recorder = ReplayRecorder(seed, difficulty, args.record) if args.record else None
+        if self.game is None:
+            autoplayer = None
+            if args.ai:
+                autoplayer = Autoplayer(args.ai_lookahead, args.ai_workers, args.ai_executor)
+            self.game = Tetris(difficulty, random.Random(seed), autoplayer, recorder,
+                               args.render, *args.board, screen=self.screen,
+                               das=args.das / 1000, arr=args.arr / 1000)
+        else:
+            self.game.new_game(difficulty, random.Random(seed), recorder)
+
+
+def soak(cycles, args=None, warmup=None, max_growth=256 * 1024):
+    # Enchaine `cycles` parties sans affichage ni son (selection, pause,
+    # chute jusqu'au game over, redemarrage) en injectant les evenements.
+    # args sont les options de la ligne de commande (--display, --render...),
+    # par defaut le rendu surface non bride.
+    # Retourne (croissance memoire en octets apres l'echauffement, ok).
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    init_pygame()
+    session = Session(args or parse_args(['--render', 'uncapped']))
+    warmup = warmup if warmup is not None else max(1, cycles // 10)
+    
+    def click(button):
+        pygame.event.post(pygame.event.Event(
+            pygame.MOUSEBUTTONDOWN, pos=button.rect.center, button=1))
+    
+    def drop_to_game_over():
+        # Toutes les pieces couvrent les deux colonnes du milieu : chaque chute
+        # y eleve la pile d'au moins une ligne, quel que soit --board
+        for _ in range(session.game.height * 2):
+            pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_SPACE))
+    
+    script = (
+        ('select', lambda: click(session.select.buttons['easy'])),
+        ('playing', lambda: click(session.game.ui.buttons['pause'])),
+        ('paused', lambda: click(session.game.ui.buttons['pause'])),
+        ('playing', drop_to_game_over),
+        ('game_over', lambda: click(session.game.game_over_buttons['restart'])),
+    )
+    tracemalloc.start()
+    baseline = None
+    for cycle in range(cycles):
+        if cycle == warmup:
+            gc.collect()
+            baseline = tracemalloc.get_traced_memory()[0]
+        for scene, inject in script:
+            if session.scene != scene:
+                raise RuntimeError(f'cycle {cycle}: expected scene {scene!r}, '
+                                   f'got {session.scene!r}')
+            pygame.event.clear()
+            inject()
+            session.scene = session.step()
+    gc.collect()
+    growth = tracemalloc.get_traced_memory()[0] - (baseline or 0)
+    tracemalloc.stop()
+    pygame.quit()
+    return growth, growth <= max_growth
+
+def check_zoom():
+    # A chaque taille de case de ZOOM_LEVELS, sans affichage : mise en pause
+    # puis passage de niveau, dont les textes sortent de la vue une fois
+    # eloigne. Le dessin partiel doit egaler un dessin complet. Retourne la
+    # liste des (taille, cas, erreur) en echec.
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    init_pygame()
+    failures = []
+    for cell in ZOOM_LEVELS:
+        for case in ('pause', 'level_up'):
+            game = Tetris('easy', random.Random(0))
+            ui = game.ui
+            ui.set_zoom(cell)
+            ui.draw()
+            if case == 'pause':
+                game.handle_input('pause')
+            else:
+                game.rows[-1] = FULL_ROW
+                game.colors[-1] = bytes([1]) * game.width
+                game._rebuild_index()
+                game.clear_lines()
+                game.version += 1
+            try:
+                ui.draw()
+            except Exception as error:
+                failures.append((cell, case, repr(error)))
+                continue
+            partial = pygame.image.tobytes(ui.screen, 'RGB')
+            ui.invalidate()
+            ui.draw()
+            if partial != pygame.image.tobytes(ui.screen, 'RGB'):
+                failures.append((cell, case, 'partial redraw differs from a full redraw'))
+    pygame.quit()
+    return failures
+
+def _measure(prepare, run, min_time=0.2, repeat=5):
+    # Duree d'une operation en secondes : prepare(n) construit l'etat de n
+    # operations hors chronometre, run(state) les execute ; meilleur de repeat.
+    # Des mesures plus courtes varient de plus de 10 % d'un lancement a l'autre.
+    n = 1
+    while True:
+        state = prepare(n)
+        start = time.perf_counter()
+        run(state)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        n *= 2 if elapsed < min_time / 10 else int(min_time / elapsed) + 1
+    best = elapsed
+    for _ in range(repeat - 1):
+        state = prepare(n)
+        start = time.perf_counter()
+        run(state)
+        best = min(best, time.perf_counter() - start)
+    return best / n
+
+
+def _filled_engine(rng, fill, full_rows=0, width=GRID_WIDTH, height=GRID_HEIGHT):
+    # Partie dont les `fill` * height lignes du bas sont remplies a un trou
+    # pres, dont `full_rows` lignes completes
+    game = TetrisEngine('medium', random.Random(rng.random()), width, height)
+    full_row = (1 << width) - 1
+    for i in range(height - int(fill * height), height):
+        row = full_row & ~(1 << rng.randrange(width))
+        if height - i <= full_rows:
+            row = full_row
+        color = rng.randrange(1, len(PIECE_TYPES) + 1)
+        game.rows[i] = row
+        game.colors[i] = bytes(color if row >> j & 1 else 0 for j in range(width))
+    game._rebuild_index()
+    return game
+
+
+def run_benchmarks():
+    # Micro et macro benchmarks sans affichage ni son ; temps en microsecondes
+    rng = random.Random(0)
+    results = {}
+
+    def record(name, seconds):
+        results[name] = {'us': seconds * 1e6, 'ops_per_sec': 1 / seconds}
+
+    def engines(n, fill=0.4, full_rows=0, drop=False):
+        games = [_filled_engine(rng, fill, full_rows) for _ in range(n)]
+        if drop:
+            for game in games:
+                piece = game.current_piece
+                while game.is_valid_move(piece.shape, piece.x, piece.y + 1):
+                    piece.y += 1
+        return games
+
+    game = _filled_engine(rng, 0.4)
+    piece = game.current_piece
+    record('is_valid_move', _measure(
+        lambda n: range(n),
+        lambda ops: [game.is_valid_move(piece.shape, piece.x, piece.y) for _ in ops]))
+    record('rotate_piece', _measure(
+        lambda n: range(n), lambda ops: [game.rotate_piece() for _ in ops]))
+    record('place_piece', _measure(
+        lambda n: engines(n, drop=True), lambda games: [g.place_piece() for g in games]))
+    for full_rows in range(5):
+        record(f'clear_lines_{full_rows}', _measure(
+            lambda n: engines(n, full_rows=full_rows),
+            lambda games: [g.clear_lines() for g in games]))
+    record('hard_drop', _measure(
+        lambda n: engines(n), lambda games: [g.hard_drop() for g in games]))
+
+    def play(games):
+        for game in games:
+            actions = random.Random(0)
+            while not game.game_over:
+                game.step(actions.choice(ACTIONS))
+    record('random_game', _measure(
+        lambda n: [TetrisEngine('hard', random.Random(i)) for i in range(n)], play))
+
+    def autoplay(games):
+        for game in games:
+            autoplayer = Autoplayer(1, executor=None)
+            for _ in range(100):
+                for action in autoplayer.choose(game):
+                    game.apply_action(action)
+    record('autoplayer_100_pieces', _measure(
+        lambda n: [TetrisEngine('hard', random.Random(i)) for i in range(n)],
+        autoplay, repeat=3))
+
+    if pygame is not None:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+        pygame.init()
+        # Plateaux dessines identiques d'un lancement a l'autre : le nombre de
+        # parties construites plus haut, donc l'etat de rng, varie
+        rng.seed(1)
+        boards = [(f'fill_{int(fill * 100)}', fill, GRID_WIDTH, GRID_HEIGHT)
+                  for fill in (0.0, 0.25, 0.5, 0.75)]
+        boards.append(('board_1000x400', 0.5, 1000, 400))
+        for label, fill, width, height in boards:
+            ui = TetrisUI(_filled_engine(rng, fill, width=width, height=height))
+
+            def move_frames(ops):
+                for i in ops:
+                    ui.game.current_piece.x += 1 if i % 2 else -1
+                    ui.game.version += 1
+                    ui.draw()
+
+            def full_frames(ops):
+                for _ in ops:
+                    ui.invalidate()
+                    ui.draw()
+            ui.draw()
+            record(f'draw_move_{label}', _measure(lambda n: range(n), move_frames))
+            record(f'draw_full_{label}', _measure(lambda n: range(n), full_frames))
+
+        # Image complete sur un ecran 1080p ou 4K : surface agrandie par
+        # pygame.transform, ou textures mises a l'echelle par le Renderer
+        engine = _filled_engine(rng, 0.5)
+        for label, size in (('1080p', (1920, 1080)), ('4k', (3840, 2160))):
+            window = pygame.display.set_mode(size)
+            canvas = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+            ui = TetrisUI(engine, screen=canvas)
+            factor = min(size[0] / SCREEN_WIDTH, size[1] / SCREEN_HEIGHT)
+            area = pygame.Rect(0, 0, SCREEN_WIDTH * factor, SCREEN_HEIGHT * factor)
+            area.center = window.get_rect().center
+            target = window.subsurface(area)
+
+            def surface_frames(ops):
+                for _ in ops:
+                    ui.invalidate()
+                    ui.draw()
+                    pygame.transform.smoothscale(canvas, target.get_size(), target)
+                    pygame.display.flip()
+            record(f'frame_surface_{label}', _measure(lambda n: range(n), surface_frames))
+
+            if sdl2_video is not None:
+                display = TextureDisplay(size)
+                texture_ui = TextureUI(engine, display)
+
+                def texture_frames(ops):
+                    for _ in ops:
+                        texture_ui.invalidate()
+                        texture_ui.draw()
+                record(f'frame_texture_{label}', _measure(lambda n: range(n), texture_frames))
+                display.close()
+
+        # Mur de 64 plateaux dont tous changent a chaque image
+        if np is not None:
+            wall = SpectatorWall([_filled_engine(rng, 0.5) for _ in range(64)])
+
+            def wall_frames(ops):
+                for _ in ops:
+                    for game in wall.games:
+                        game.version += 1
+                    wall.draw()
+            record('wall_64_boards', _measure(lambda n: range(n), wall_frames))
+        pygame.quit()
+    return {
+        'python': sys.version.split()[0],
+        'pygame': pygame.version.ver if pygame is not None else None,
+        'results': results,
+    }
+
+
+def compare_benchmarks(results, baseline, threshold):
+    # Chemins ralentis de plus de `threshold` par rapport a baseline, et noms
+    # de baseline absents des resultats : (regressions, manquants)
+    regressions = []
+    missing = []
+    for name, base in baseline['results'].items():
+        current = results['results'].get(name)
+        if current is None:
+            missing.append(name)
+        elif current['us'] > base['us'] * (1 + threshold):
+            regressions.append((name, base['us'], current['us']))
+    return regressions, missing
+
+
+def board_size(text):
+    # 'LARGEURxHAUTEUR', par exemple '100x400'
+    try:
+        width, height = (int(n) for n in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected WIDTHxHEIGHT, got {text!r}')
+    if width < 4 or height < 4:
+        raise argparse.ArgumentTypeError('the board must be at least 4x4')
+    return width, height
+
+
+def address(text):
+    # '[HOTE:]PORT'
+    host, _, port = text.rpartition(':')
+    try:
+        return host or '127.0.0.1', int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected [HOST:]PORT, got {text!r}')
+
+
+def _versus_load_report(matches):
+    tick = versus_load(matches)
+    print(f'{matches} matches, {tick["count"]} ticks: mean {tick["mean_ms"]:.2f} ms, '
+          f'p99 {tick["p99_ms"]:.2f} ms, max {tick["max_ms"]:.2f} ms')
+    return tick
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Tetris')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='print import, init, asset and first-frame times')
+    parser.add_argument('--ai', action='store_true',
+                        help='let the autoplayer play (toggle in game with A)')
+    parser.add_argument('--ai-lookahead', type=int, default=2,
+                        help='number of pieces the autoplayer searches ahead')
+    parser.add_argument('--ai-workers', type=int, default=None,
+                        help='size of the autoplayer search pool')
+    parser.add_argument('--ai-executor', choices=('thread', 'process', 'none'),
+                        default='none',
+                        help='pool spreading each autoplayer search (threads share the GIL)')
+    parser.add_argument('--render', choices=RENDER_MODES, default='throttle',
+                        help='frame pacing: %(choices)s')
+    parser.add_argument('--frame-stats', action='store_true',
+                        help='print frame, tick, gravity and input latency timing on exit')
+    parser.add_argument('--display', choices=DISPLAY_BACKENDS, default='surface',
+                        help='drawing backend: %(choices)s (texture uses the SDL2 renderer)')
+    parser.add_argument('--fullscreen', action='store_true',
+                        help='fill the screen (texture display)')
+    parser.add_argument('--scale', choices=SCALING_MODES, default=None,
+                        help='how the texture display fits the window: %(choices)s')
+    parser.add_argument('--das', type=float, default=DAS * 1000, metavar='MS',
+                        help=f'delay before a held key repeats (default {DAS * 1000:g} ms)')
+    parser.add_argument('--arr', type=float, default=ARR * 1000, metavar='MS',
+                        help=f'interval between repeats of a held key (default {ARR * 1000:g} ms)')
+    parser.add_argument('--profile', action='store_true',
+                        help='time each frame phase (F3 shows the overlay)')
+    parser.add_argument('--profile-trace', metavar='FILE',
+                        help='write the phase timings as a Chrome trace, or CSV for *.csv')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='run the headless benchmark suite and exit')
+    parser.add_argument('--benchmark-output', metavar='FILE',
+                        help='write benchmark results as JSON to FILE')
+    parser.add_argument('--baseline', metavar='FILE',
+                        help='fail if a benchmark is slower than in this JSON file, or missing')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='allowed slowdown against --baseline (default 0.10)')
+    parser.add_argument('--board', type=board_size, default=(GRID_WIDTH, GRID_HEIGHT),
+                        metavar='WxH',
+                        help=f'board size in cells (default {GRID_WIDTH}x{GRID_HEIGHT})')
+    parser.add_argument('--soak', type=int, metavar='N',
+                        help='run N headless restart cycles and check memory stays flat')
+    parser.add_argument('--check-zoom', action='store_true',
+                        help='check pause and level-up redraws headless at every zoom level')
+    parser.add_argument('--serve', type=address, metavar='[HOST:]PORT',
+                        help='host versus matches on this address')
+    parser.add_argument('--connect', type=address, metavar='[HOST:]PORT',
+                        help='join a versus match on this server')
+    parser.add_argument('--versus-load', type=int, metavar='N',
+                        help='run N bot matches against a local server and check tick times')
+    parser.add_argument('--spectate', type=int, metavar='N',
+                        help='watch N random bot games tiled in one window')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed of the piece sequence')
+    parser.add_argument('--record', metavar='FILE',
+                        help='record the session as a replay file')
+    parser.add_argument('--replay', metavar='FILE',
+                        help='play a replay file back in real time')
+    parser.add_argument('--verify', metavar='FILE', nargs='+',
+                        help='replay files headless and check their scores')
+    args = parser.parse_args(argv)
+    if args.board != (GRID_WIDTH, GRID_HEIGHT) and (args.ai or args.record or args.replay):
+        # L'autoplayer et les replays supposent le plateau standard
+        parser.error('--ai, --record and --replay need the standard board')
+    if args.display != 'texture' and (args.fullscreen or args.scale):
+        parser.error('--fullscreen and --scale need --display texture')
+    if args.spectate is not None and args.spectate < 1:
+        parser.error('--spectate needs at least one game')
+    if args.spectate is not None and args.spectate > SpectatorWall.MAX_GAMES:
+        parser.error(f'--spectate supports at most {SpectatorWall.MAX_GAMES} games')
+    if args.das < 0 or args.arr <= 0:
+        parser.error('--das must be >= 0 and --arr > 0')
+    if args.seed is not None and not 0 <= args.seed < 2 ** 64:
+        # La graine est ecrite en entier non signe de 64 bits dans les replays
+        parser.error('--seed must be between 0 and 2**64 - 1')
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.benchmark:
+        results = run_benchmarks()
+        if args.benchmark_output:
+            with open(args.benchmark_output, 'w') as f:
+                json.dump(results, f, indent=2)
+        for name, result in results['results'].items():
+            print(f'{name:<24} {result["us"]:12.3f} us')
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+            regressions, missing = compare_benchmarks(results, baseline, args.threshold)
+            for name, before, after in regressions:
+                print(f'REGRESSION {name}: {before:.3f} us -> {after:.3f} us')
+            for name in missing:
+                print(f'MISSING {name}: in the baseline but not measured')
+            return 1 if regressions or missing else 0
+        return 0
+    
+    if args.soak:
+        growth, ok = soak(args.soak, args)
+        print(f'{args.soak} restart cycles, memory growth after warm-up: {growth / 1024:.1f} KiB')
+        return 0 if ok else 1
+    
+    if args.check_zoom:
+        failures = check_zoom()
+        for cell, case, error in failures:
+            print(f'cell {cell}, {case}: {error}')
+        print(f'{len(ZOOM_LEVELS) * 2 - len(failures)}/{len(ZOOM_LEVELS) * 2} zoom checks passed')
+        return 1 if failures else 0
+    
+    if args.versus_load:
+        tick = _versus_load_report(args.versus_load)
+        return 0 if tick['p99_ms'] < 5 else 1
+    
+    if args.serve:
+        host, port = args.serve
+        with contextlib.suppress(KeyboardInterrupt):
+            asyncio.run(VersusServer().run(
+                host, port, lambda port: print(f'versus server on {host}:{port}')))
+        return 0
+    
+    if args.verify:
+        failed = 0
+        for path, expected, actual in verify_replays(args.verify):
+            if expected != actual:
+                failed += 1
+                print(f'{path}: expected score/lines {expected}, replayed {actual}')
+        print(f'{len(args.verify) - failed}/{len(args.verify)} replays verified')
+        return 1 if failed else 0
+    
+    PROFILER.trace = bool(args.profile_trace)
+    PROFILER.enabled = args.profile or PROFILER.trace
+    profile = StartupProfile() if args.profile_startup else None
+    if profile:
+        profile.mark('import')
+    
+    init_pygame()
+    if profile:
+        profile.mark('init')
+    
+    # Les sons se chargent pendant l'ecran de selection
+    ASSETS.prefetch()
+    
+    def first_frame():
+        if profile:
+            profile.mark('first frame')
+            ASSETS.wait()
+            print(profile.report())
+    
+    if args.spectate:
+        games, advance = spectator_bots(args.spectate, args.seed, *args.board)
+        wall = SpectatorWall(games)
+        wall.run(advance)
+        if args.frame_stats:
+            print(wall.stats.report())
+        pygame.quit()
+        return 0
+    
+    if args.connect:
+        screen = open_display(False, args.display, args.fullscreen, args.scale or 'smooth')
+        difficulty = DifficultySelect(screen).run(first_frame)
+        if difficulty:
+            VersusClient(*args.connect, difficulty, screen,
+                         args.das / 1000, args.arr / 1000).run()
+        pygame.quit()
+        return 0
+    
+    if args.replay:
+        replay = Replay.load(args.replay)
+        game = Tetris(replay.difficulty, random.Random(replay.seed))
+        game.play_replay(replay)
+        pygame.quit()
+        return 0
     
-    if difficulty:
-        SOUNDS['start'].play()
-        game = Tetris(difficulty)
-        game.run()
+    # Sélection de la difficulté, parties et redémarrages dans une seule fenêtre
+    session = Session(args, first_frame)
+    session.run()
+    if session.game:
+        if args.frame_stats:
+            print(session.game.stats.report())
+            print(AUDIO.report())
+            print(TEXT_CACHE.report())
+            autoplayer = session.game.autoplayer
+            if autoplayer:
+                # Avec --ai-executor process, la recherche remplit le cache
+                # de chaque processus du pool, pas celui-ci
+                print(autoplayer.cache.report('autoplayer cache'))
+        if args.profile_trace:
+            PROFILER.export(args.profile_trace)
     
+    AUDIO.close()
     pygame.quit()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file